@@ -0,0 +1,218 @@
+import os
+import fcntl
+import shutil
+import hashlib
+import tempfile
+import threading
+import subprocess
+from contextlib import contextmanager
+
+from cwm_worker_deployment import config
+
+
+# written to the chart version cache directory after a successful pull, contains a digest of all the other files
+DIGEST_FILE_NAME = '.cwm-worker-deployment-digest'
+
+# chart version cache paths which were verified by this process
+_verified_paths = set()
+_verified_paths_lock = threading.Lock()
+
+
+def get_chart_cache_path(chart_name, version):
+    return os.path.join(config.CWM_WORKER_DEPLOYMENT_HELM_CACHE_DIR, chart_name, version)
+
+
+def _get_lock_path(chart_name, version):
+    return os.path.join(config.CWM_WORKER_DEPLOYMENT_HELM_CACHE_DIR, chart_name, '.{}.lock'.format(version))
+
+
+# file lock per chart version, shared locks can be held concurrently, exclusive lock waits for all other locks
+# it works between processes and between threads of the same process
+# if blocking is False and the lock is held, raises BlockingIOError
+@contextmanager
+def lock(chart_name, version, shared=False, blocking=True):
+    lock_path = _get_lock_path(chart_name, version)
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    with open(lock_path, 'a') as f:
+        fcntl.flock(f, (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | (0 if blocking else fcntl.LOCK_NB))
+        yield
+
+
+# the last access time of a chart version is the modification time of its lock file
+def _touch(chart_name, version):
+    try:
+        os.utime(_get_lock_path(chart_name, version))
+    except FileNotFoundError:
+        pass
+
+
+def _get_last_access(chart_name, version):
+    try:
+        return os.path.getmtime(_get_lock_path(chart_name, version))
+    except FileNotFoundError:
+        return os.path.getmtime(get_chart_cache_path(chart_name, version))
+
+
+def get_digest(path):
+    digest = hashlib.sha256()
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            file_path = os.path.join(dirpath, filename)
+            relpath = os.path.relpath(file_path, path)
+            if relpath == DIGEST_FILE_NAME:
+                continue
+            digest.update(relpath.encode() + b'\0')
+            with open(file_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(65536), b''):
+                    digest.update(chunk)
+            digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _is_valid(chart_cache_path):
+    try:
+        with open(os.path.join(chart_cache_path, DIGEST_FILE_NAME)) as f:
+            return f.read().strip() == get_digest(chart_cache_path)
+    except FileNotFoundError:
+        return False
+
+
+def _pull(chart_name, version, chart_repo, untardir):
+    subprocess.check_call(["helm", "pull", chart_name, "--repo", chart_repo, "--untar", "--untardir", untardir,
+                           "--version", version])
+
+
+# makes sure the chart version is pulled to the cache and returns the chart path
+# the chart is pulled to a temporary directory and renamed into place only after it was pulled successfully
+# concurrent callers for the same chart version wait for a single pull
+# the cached chart digest is verified once per process, an invalid or incomplete cached chart is pulled again
+def init(chart_name, version, chart_repo):
+    chart_cache_path = get_chart_cache_path(chart_name, version)
+    with _verified_paths_lock:
+        is_verified = chart_cache_path in _verified_paths
+    if not is_verified or not os.path.exists(os.path.join(chart_cache_path, DIGEST_FILE_NAME)):
+        with lock(chart_name, version):
+            if not _is_valid(chart_cache_path):
+                if os.path.exists(chart_cache_path):
+                    invalid_path = tempfile.mkdtemp(dir=os.path.dirname(chart_cache_path), prefix='.invalid-{}-'.format(version))
+                    os.rename(chart_cache_path, os.path.join(invalid_path, version))
+                    shutil.rmtree(invalid_path)
+                tmp_path = tempfile.mkdtemp(dir=os.path.dirname(chart_cache_path), prefix='.tmp-{}-'.format(version))
+                try:
+                    _pull(chart_name, version, chart_repo, tmp_path)
+                    with open(os.path.join(tmp_path, DIGEST_FILE_NAME), 'w') as f:
+                        f.write(get_digest(tmp_path))
+                    os.chmod(tmp_path, 0o755)
+                    os.rename(tmp_path, chart_cache_path)
+                except Exception:
+                    shutil.rmtree(tmp_path, ignore_errors=True)
+                    raise
+            with _verified_paths_lock:
+                _verified_paths.add(chart_cache_path)
+    _touch(chart_name, version)
+    return os.path.join(chart_cache_path, chart_name)
+
+
+# makes sure the chart version is cached and yields the chart path while holding a shared lock on it
+# while the shared lock is held, the chart version will not be evicted by gc
+@contextmanager
+def use(chart_name, version, chart_repo):
+    while True:
+        chart_path = init(chart_name, version, chart_repo)
+        with lock(chart_name, version, shared=True):
+            # the chart version might have been evicted between init and getting the lock
+            if os.path.exists(os.path.join(get_chart_cache_path(chart_name, version), DIGEST_FILE_NAME)):
+                yield chart_path
+                return
+
+
+def _get_size(path):
+    size = 0
+    for dirpath, dirnames, filenames in os.walk(path):
+        for filename in filenames:
+            size += os.path.getsize(os.path.join(dirpath, filename))
+    return size
+
+
+def _remove(path):
+    removed_path = tempfile.mkdtemp(dir=os.path.dirname(path), prefix='.removed-{}-'.format(os.path.basename(path)))
+    os.rename(path, os.path.join(removed_path, os.path.basename(path)))
+    shutil.rmtree(removed_path)
+
+
+# removes leftovers of interrupted pulls / removals, if the chart version is not locked
+def _remove_leftovers(chart_name, dry_run):
+    chart_path = os.path.join(config.CWM_WORKER_DEPLOYMENT_HELM_CACHE_DIR, chart_name)
+    for name in os.listdir(chart_path):
+        for prefix in ('.tmp-', '.invalid-', '.removed-'):
+            if name.startswith(prefix) and os.path.isdir(os.path.join(chart_path, name)):
+                version = name[len(prefix):].rsplit('-', 1)[0]
+                try:
+                    with lock(chart_name, version, blocking=False):
+                        if not dry_run:
+                            shutil.rmtree(os.path.join(chart_path, name), ignore_errors=True)
+                except BlockingIOError:
+                    pass
+
+
+def _iterate_cached_versions():
+    cache_dir = config.CWM_WORKER_DEPLOYMENT_HELM_CACHE_DIR
+    if os.path.exists(cache_dir):
+        for chart_name in sorted(os.listdir(cache_dir)):
+            # skips other caches (e.g. helm.REPO_INDEX_CACHE_DIR_NAME)
+            if chart_name.startswith(('_', '.')) or not os.path.isdir(os.path.join(cache_dir, chart_name)):
+                continue
+            for version in sorted(os.listdir(os.path.join(cache_dir, chart_name))):
+                if not version.startswith('.') and os.path.isdir(get_chart_cache_path(chart_name, version)):
+                    yield chart_name, version
+
+
+# evicts cached chart versions, least recently used first, until each chart has at most max_versions_per_chart
+# versions and all cached versions have at most max_bytes total size (0 / None = no limit)
+# never evicts the latest cached 0.0.0-YYYYMMDDTHHMMSS version of each chart, versions in keep_versions
+# (dict of chart_name -> list of versions), or versions which are locked (in use by a deploy or being pulled)
+# returns a list of the evicted (chart_name, version, size_bytes)
+def gc(max_versions_per_chart=None, max_bytes=None, keep_versions=None, dry_run=False):
+    if max_versions_per_chart is None:
+        max_versions_per_chart = config.CHART_CACHE_MAX_VERSIONS_PER_CHART
+    if max_bytes is None:
+        max_bytes = config.CHART_CACHE_MAX_BYTES
+    keep_versions = keep_versions or {}
+    cached_versions = {}
+    for chart_name, version in _iterate_cached_versions():
+        cached_versions.setdefault(chart_name, []).append({
+            'chart_name': chart_name,
+            'version': version,
+            'size': _get_size(get_chart_cache_path(chart_name, version)),
+            'last_access': _get_last_access(chart_name, version),
+        })
+    candidates = []
+    for chart_name, versions in cached_versions.items():
+        _remove_leftovers(chart_name, dry_run)
+        chart_keep_versions = set(keep_versions.get(chart_name, []))
+        nightly_versions = sorted(v['version'] for v in versions if v['version'].startswith('0.0.0-'))
+        if nightly_versions:
+            chart_keep_versions.add(nightly_versions[-1])
+        versions = sorted(versions, key=lambda v: v['last_access'], reverse=True)
+        for i, v in enumerate(versions):
+            v['keep'] = v['version'] in chart_keep_versions
+            v['over_max_versions'] = bool(max_versions_per_chart) and i >= max_versions_per_chart
+            candidates.append(v)
+    total_bytes = sum(v['size'] for v in candidates)
+    evicted = []
+    for v in sorted(candidates, key=lambda v: v['last_access']):
+        if v['keep'] or not (v['over_max_versions'] or (max_bytes and total_bytes > max_bytes)):
+            continue
+        try:
+            with lock(v['chart_name'], v['version'], blocking=False):
+                chart_cache_path = get_chart_cache_path(v['chart_name'], v['version'])
+                if not dry_run:
+                    with _verified_paths_lock:
+                        _verified_paths.discard(chart_cache_path)
+                    _remove(chart_cache_path)
+        except BlockingIOError:
+            continue
+        total_bytes -= v['size']
+        evicted.append((v['chart_name'], v['version'], v['size']))
+    return evicted
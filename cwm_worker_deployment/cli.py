@@ -2,6 +2,7 @@ import sys
 from ruamel import yaml
 
 from cwm_worker_deployment import deployment
+from cwm_worker_deployment import serialization
 
 
 def main():
@@ -10,16 +11,17 @@ def main():
         dry_run = "--dry-run" in args
         deployment.init(dry_run=dry_run)
     elif len(sys.argv) > 1 and sys.argv[1] == "deploy":
-        spec = yaml.safe_load(sys.stdin)
+        spec = serialization.yaml_safe_load(sys.stdin)
         args = sys.argv[2:]
         dry_run = "--dry-run" in args
+        force = "--force" in args
         atomic_timeout_string = None
         last_arg = None
         for arg in args:
             if last_arg == "--atomic-timeout":
                 atomic_timeout_string = arg
             last_arg = arg
-        deployment.deploy(spec, dry_run=dry_run, atomic_timeout_string=atomic_timeout_string)
+        deployment.deploy(spec, dry_run=dry_run, atomic_timeout_string=atomic_timeout_string, force=force)
     elif len(sys.argv) > 1 and sys.argv[1] == "delete":
         args = sys.argv[2:]
         namespace_name = args[0]
@@ -60,6 +62,21 @@ def main():
         print(deployment.get_hostname(namespace_name, deployment_type, protocol))
     elif len(sys.argv) > 1 and sys.argv[1] == "chart_cache_init":
         print(deployment.chart_cache_init(*sys.argv[2:]))
+    elif len(sys.argv) > 1 and sys.argv[1] == "serve":
+        from . import server
+        args = sys.argv[2:]
+        with_cache_warmer = "--no-cache-warmer" not in args
+        host, port, unix_socket_path = None, None, None
+        last_arg = None
+        for arg in args:
+            if last_arg == "--host":
+                host = arg
+            elif last_arg == "--port":
+                port = int(arg)
+            elif last_arg == "--unix-socket":
+                unix_socket_path = arg
+            last_arg = arg
+        server.serve(host=host, port=port, unix_socket_path=unix_socket_path, with_cache_warmer=with_cache_warmer)
     else:
         from . import click_cli
         click_cli.main()
@@ -1,3 +1,5 @@
+import time
+
 from ruamel import yaml
 import click
 
@@ -21,3 +23,36 @@ main.add_command(deployment)
 def get_health(**kwargs):
     from .deployment import get_health
     print(yaml.safe_dump(get_health(**kwargs), default_flow_style=False))
+
+
+@click.group()
+def cache():
+    pass
+
+
+main.add_command(cache)
+
+
+@cache.command()
+@click.option('--max-versions-per-chart', type=int, help='defaults to CHART_CACHE_MAX_VERSIONS_PER_CHART env var')
+@click.option('--max-bytes', type=int, help='defaults to CHART_CACHE_MAX_BYTES env var (0 = no limit)')
+@click.option('--dry-run', is_flag=True)
+def gc(**kwargs):
+    from .deployment import chart_cache_gc
+    evicted = [
+        {'chart_name': chart_name, 'version': version, 'size_bytes': size_bytes}
+        for chart_name, version, size_bytes in chart_cache_gc(**kwargs)
+    ]
+    print(yaml.safe_dump(evicted, default_flow_style=False))
+
+
+@cache.command()
+@click.option('--max-workers', type=int, help='defaults to CHART_CACHE_WARM_MAX_WORKERS env var')
+@click.option('--interval-seconds', type=int, help='keep running and warm the cache every interval seconds')
+def warm(interval_seconds, **kwargs):
+    from .deployment import chart_cache_warm
+    while True:
+        print(yaml.safe_dump(chart_cache_warm(**kwargs), default_flow_style=False), flush=True)
+        if not interval_seconds:
+            break
+        time.sleep(interval_seconds)
@@ -0,0 +1,74 @@
+#
+# thin client for the deployment server (cwm_worker_deployment serve)
+# it only uses the standard library so it starts fast and doesn't need the kubernetes client
+#
+import os
+import sys
+import json
+import socket
+import http.client
+from urllib.parse import urlparse
+
+
+DEFAULT_SERVER_URL = "unix:///var/run/cwm-worker-deployment.sock"
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, unix_socket_path, timeout=None):
+        super(UnixHTTPConnection, self).__init__('localhost', timeout=timeout)
+        self.unix_socket_path = unix_socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_socket_path)
+
+
+# server_url is unix:///path/to/socket or http://host:port (default from CWM_WORKER_DEPLOYMENT_SERVER_URL env var)
+def _get_connection(server_url, timeout):
+    server_url = urlparse(server_url or os.environ.get("CWM_WORKER_DEPLOYMENT_SERVER_URL") or DEFAULT_SERVER_URL)
+    if server_url.scheme == 'unix':
+        return UnixHTTPConnection(server_url.path, timeout=timeout)
+    else:
+        return http.client.HTTPConnection(server_url.hostname, server_url.port, timeout=timeout)
+
+
+# calls a deployment function on the server and returns its result, raises an exception if it failed
+def call(method, server_url=None, timeout=None, **kwargs):
+    conn = _get_connection(server_url, timeout)
+    try:
+        conn.request('POST', '/{}'.format(method), body=json.dumps(kwargs), headers={'Content-Type': 'application/json'})
+        res = conn.getresponse()
+        data = json.loads(res.read())
+    finally:
+        conn.close()
+    if not data.get('success'):
+        raise Exception(data.get('error'))
+    return data['result']
+
+
+# usage: cwm_worker_deployment_client METHOD [KWARGS_JSON]
+# KWARGS_JSON is a json object of the method keyword arguments, use - to read it from stdin
+# e.g. cwm_worker_deployment_client is_ready '{"namespace_name": "example007--com", "deployment_type": "minio"}'
+def main():
+    if len(sys.argv) < 2:
+        print('usage: cwm_worker_deployment_client METHOD [KWARGS_JSON]', file=sys.stderr)
+        exit(2)
+    method = sys.argv[1]
+    kwargs_json = sys.argv[2] if len(sys.argv) > 2 else '{}'
+    if kwargs_json == '-':
+        kwargs_json = sys.stdin.read()
+    try:
+        result = call(method, **json.loads(kwargs_json))
+    except Exception as e:
+        print(str(e), file=sys.stderr)
+        exit(1)
+    print(json.dumps(result, indent=2))
+    if method == 'is_ready' and not result:
+        exit(10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
+# runs the functions concurrently with up to max_workers threads and returns their results in the same order
+# all functions run to completion, if any of them raised an exception the first one (by order) is raised
+def run_all(funcs, max_workers):
+    funcs = list(funcs)
+    if not funcs:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(funcs))) as executor:
+        futures = [executor.submit(func) for func in funcs]
+    return [future.result() for future in futures]
+
+
+# runs a dict of key -> function concurrently with up to max_workers threads, without stopping on failures
+# returns a dict of key -> (True, result) or (False, exception)
+def run_each(funcs, max_workers):
+    if not funcs:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(funcs))) as executor:
+        futures = {key: executor.submit(func) for key, func in funcs.items()}
+    results = {}
+    for key, future in futures.items():
+        exception = future.exception()
+        results[key] = (False, exception) if exception else (True, future.result())
+    return results
@@ -2,7 +2,35 @@ import os
 
 
 CWM_WORKER_DEPLOYMENT_HELM_CACHE_DIR = os.environ.get("CWM_WORKER_DEPLOYMENT_HELM_CACHE_DIR") or "/var/cache/cwm-worker-deployment-helm-cache"
+CHART_CACHE_MAX_VERSIONS_PER_CHART = int(os.environ.get("CHART_CACHE_MAX_VERSIONS_PER_CHART") or "5")
+CHART_CACHE_MAX_BYTES = int(os.environ.get("CHART_CACHE_MAX_BYTES") or "0")
+CHART_CACHE_WARM_MAX_WORKERS = int(os.environ.get("CHART_CACHE_WARM_MAX_WORKERS") or "4")
+CHART_CACHE_WARM_INTERVAL_SECONDS = int(os.environ.get("CHART_CACHE_WARM_INTERVAL_SECONDS") or "300")
+HELM_REPO_INDEX_CACHE_TTL_SECONDS = int(os.environ.get("HELM_REPO_INDEX_CACHE_TTL_SECONDS") or "60")
+HELM_REPO_INDEX_TIMEOUT_SECONDS = int(os.environ.get("HELM_REPO_INDEX_TIMEOUT_SECONDS") or "15")
+HELM_RELEASES_FROM_SECRETS = (os.environ.get("HELM_RELEASES_FROM_SECRETS") or "yes") == "yes"
+HELM_RELEASES_CACHE_MAX_SIZE = int(os.environ.get("HELM_RELEASES_CACHE_MAX_SIZE") or "1000")
+KUBE_CONNECTION_POOL_MAXSIZE = int(os.environ.get("KUBE_CONNECTION_POOL_MAXSIZE") or "20")
+KUBE_WATCH_CONNECTION_POOL_MAXSIZE = int(os.environ.get("KUBE_WATCH_CONNECTION_POOL_MAXSIZE") or "60")
+KUBE_REQUEST_TIMEOUT_SECONDS = float(os.environ.get("KUBE_REQUEST_TIMEOUT_SECONDS") or "60")
+KUBE_CLIENT_QPS = float(os.environ.get("KUBE_CLIENT_QPS") or "0")
+KUBE_CLIENT_BURST = int(os.environ.get("KUBE_CLIENT_BURST") or "10")
+APPLY_OBJECTS_MAX_WORKERS = int(os.environ.get("APPLY_OBJECTS_MAX_WORKERS") or "10")
 PROMETHEUS_URL = os.environ.get("PROMETHEUS_URL") or "http://localhost:9090"
+HTTP_POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS") or "10")
+HTTP_POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE") or "10")
+HTTP_RETRIES = int(os.environ.get("HTTP_RETRIES") or "3")
+HTTP_RETRY_BACKOFF_FACTOR = float(os.environ.get("HTTP_RETRY_BACKOFF_FACTOR") or "0.3")
+PROMETHEUS_BULK_MAX_NAMESPACES_PER_QUERY = int(os.environ.get("PROMETHEUS_BULK_MAX_NAMESPACES_PER_QUERY") or "500")
+DELETE_DATA_TIMEOUT_SECONDS = int(os.environ.get("DELETE_DATA_TIMEOUT_SECONDS") or "1800")
+DELETE_DATA_WATCH_RESYNC_SECONDS = int(os.environ.get("DELETE_DATA_WATCH_RESYNC_SECONDS") or "60")
+DEPLOY_MANY_MAX_WORKERS = int(os.environ.get("DEPLOY_MANY_MAX_WORKERS") or "10")
+DELETE_MANY_MAX_WORKERS = int(os.environ.get("DELETE_MANY_MAX_WORKERS") or "10")
+DELETE_MANY_DELETE_DATA_MAX_WORKERS = int(os.environ.get("DELETE_MANY_DELETE_DATA_MAX_WORKERS") or "50")
+CWM_WORKER_DEPLOYMENT_SERVER_UNIX_SOCKET = os.environ.get("CWM_WORKER_DEPLOYMENT_SERVER_UNIX_SOCKET") or "/var/run/cwm-worker-deployment.sock"
+CWM_WORKER_DEPLOYMENT_SERVER_HOST = os.environ.get("CWM_WORKER_DEPLOYMENT_SERVER_HOST") or "127.0.0.1"
+CWM_WORKER_DEPLOYMENT_SERVER_PORT = int(os.environ.get("CWM_WORKER_DEPLOYMENT_SERVER_PORT") or "8086")
+CWM_WORKER_DEPLOYMENT_SERVER_DEBUG = os.environ.get("CWM_WORKER_DEPLOYMENT_SERVER_DEBUG") == "yes"
 
 DEPLOYMENT_TYPES = {
     "minio": {
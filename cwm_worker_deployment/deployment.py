@@ -1,8 +1,14 @@
-from ruamel import yaml
+import sys
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 
 from cwm_worker_deployment import config
+from cwm_worker_deployment import chart_cache
+from cwm_worker_deployment import concurrency
 from cwm_worker_deployment import helm
 from cwm_worker_deployment import namespace
+from cwm_worker_deployment import serialization
 
 
 def _get_release_name(namespace_name, deployment_type):
@@ -13,8 +19,31 @@ def _is_ready_deployment(namespace_name, deployment_type, readiness_check, names
     return namespace_lib.is_ready_deployment(namespace_name, readiness_check['deployment_name'])
 
 
-def _get_metrics_namespace_prometheus_rate_query(namespace_name, deployment_type, metrics_check, namespace_lib):
-    return namespace_lib.metrics_check_prometheus_rate_query(namespace_name, metrics_check['query'])
+def _get_metrics_namespace_prometheus_rate_queries(namespace_name, deployment_type, metrics_checks, namespace_lib):
+    return namespace_lib.metrics_check_prometheus_rate_queries(namespace_name, {
+        metrics_check['name']: metrics_check['query'] for metrics_check in metrics_checks
+    })
+
+
+def _get_metrics_bulk_namespace_prometheus_rate_queries(namespace_names, deployment_type, metrics_checks, namespace_lib):
+    return namespace_lib.metrics_check_prometheus_rate_queries_bulk(namespace_names, {
+        metrics_check['name']: metrics_check['query'] for metrics_check in metrics_checks
+    })
+
+
+def _get_error_message(exception):
+    return '{}: {}'.format(exception.__class__.__name__, exception)
+
+
+def _get_many_results(keys, results, result_name=None):
+    many_results = {}
+    for key in keys:
+        success, result = results[key]
+        if success:
+            many_results[key] = {"success": True, **({result_name: result} if result_name else {})}
+        else:
+            many_results[key] = {"success": False, "error": _get_error_message(result)}
+    return many_results
 
 
 def _delete_deployment(namespace_name, deployment_type, deletion, namespace_lib, force_now=False):
@@ -25,9 +54,89 @@ def _delete_data(namespace_name, deployment_type, delete_data_config, namespace_
     return namespace_lib.delete_data(namespace_name, delete_data_config)
 
 
+def _get_chart_name(deployment_type):
+    return "cwm-worker-deployment-{}".format(deployment_type)
+
+
+def _get_chart_repo(deployment_type):
+    return "https://raw.githubusercontent.com/CloudWebManage/cwm-worker-helm/master/cwm-worker-deployment-{}".format(deployment_type)
+
+
 def chart_cache_init(chart_name, version, deployment_type):
-    chart_repo = "https://raw.githubusercontent.com/CloudWebManage/cwm-worker-helm/master/cwm-worker-deployment-{}".format(deployment_type)
-    return helm.chart_cache_init(chart_name, version, chart_repo)
+    return helm.chart_cache_init(chart_name, version, _get_chart_repo(deployment_type))
+
+
+def _chart_cache_warm(deployment_type, helm_lib):
+    chart_name, chart_repo = _get_chart_name(deployment_type), _get_chart_repo(deployment_type)
+    version = helm_lib.get_latest_version(chart_repo, chart_name)
+    helm_lib.chart_cache_init(chart_name, version, chart_repo)
+    return version
+
+
+# resolves the latest chart version of each deployment type and pulls it to the chart cache if missing
+# so that deploys of new versions don't have to wait for the pull
+# returns a dict of deployment_type -> {"success": True, "version": latest_version} or {"success": False, "error": "..."}
+def chart_cache_warm(deployment_types=None, max_workers=None, helm_lib=None):
+    if not helm_lib:
+        helm_lib = helm
+    if deployment_types is None:
+        deployment_types = list(config.DEPLOYMENT_TYPES.keys())
+    if max_workers is None:
+        max_workers = config.CHART_CACHE_WARM_MAX_WORKERS
+    results = concurrency.run_each({
+        deployment_type: partial(_chart_cache_warm, deployment_type, helm_lib)
+        for deployment_type in deployment_types
+    }, max_workers)
+    return _get_many_results(deployment_types, results, "version")
+
+
+# background thread and stop event of the chart cache warmer, see start_chart_cache_warmer
+_chart_cache_warmer = None
+
+
+# runs chart_cache_warm in a background thread every interval_seconds, until stop_chart_cache_warmer is called
+def start_chart_cache_warmer(interval_seconds=None, **kwargs):
+    global _chart_cache_warmer
+    stop_chart_cache_warmer()
+    if interval_seconds is None:
+        interval_seconds = config.CHART_CACHE_WARM_INTERVAL_SECONDS
+    stop_event = threading.Event()
+
+    def _run():
+        while not stop_event.is_set():
+            for deployment_type, result in chart_cache_warm(**kwargs).items():
+                if not result["success"]:
+                    print('WARNING: failed to warm chart cache ({}: {})'.format(deployment_type, result["error"]), file=sys.stderr)
+            stop_event.wait(interval_seconds)
+
+    thread = threading.Thread(target=_run, daemon=True)
+    thread.start()
+    _chart_cache_warmer = (thread, stop_event)
+
+
+def stop_chart_cache_warmer():
+    global _chart_cache_warmer
+    if _chart_cache_warmer:
+        thread, stop_event = _chart_cache_warmer
+        stop_event.set()
+        thread.join()
+        _chart_cache_warmer = None
+
+
+# evicts least recently used chart versions from the chart cache, see chart_cache.gc
+# the latest version of each deployment type is kept, if it can be resolved
+def chart_cache_gc(max_versions_per_chart=None, max_bytes=None, dry_run=False, helm_lib=None):
+    if not helm_lib:
+        helm_lib = helm
+    keep_versions = {}
+    for deployment_type in config.DEPLOYMENT_TYPES:
+        chart_name, chart_repo = _get_chart_name(deployment_type), _get_chart_repo(deployment_type)
+        try:
+            keep_versions[chart_name] = [helm_lib.get_latest_version(chart_repo, chart_name)]
+        except Exception as e:
+            print('WARNING: failed to get latest version, it might be evicted ({}: {})'.format(chart_name, _get_error_message(e)), file=sys.stderr)
+    return chart_cache.gc(max_versions_per_chart=max_versions_per_chart, max_bytes=max_bytes,
+                          keep_versions=keep_versions, dry_run=dry_run)
 
 
 def init(spec, namespace_lib=None):
@@ -41,42 +150,51 @@ def init(spec, namespace_lib=None):
     namespace_lib.init(namespace_name)
 
 
-def deploy_preprocess_specs(specs, helm_lib=None):
+def _deploy_preprocess_spec(spec, helm_lib, helm_latest_versions):
+    spec = {**spec}
+    deployment_spec = spec.pop('cwm-worker-deployment')
+    deployment_type = deployment_spec["type"]
+    assert deployment_type in config.DEPLOYMENT_TYPES, 'unknown deployment type: {}'.format(deployment_type)
+    if deployment_type == 'minio':
+        spec.setdefault('minio', {})['serveSingleProtocolPerPod'] = True
+    namespace_name = deployment_spec['namespace']
+    release_name = _get_release_name(namespace_name, deployment_type)
+    chart_repo = _get_chart_repo(deployment_type)
+    repo_name = "cwm-worker-deployment-{}".format(deployment_type)
+    chart_name = _get_chart_name(deployment_type)
+    version = deployment_spec.get('version', 'latest')
+    chart_path = deployment_spec.get('chart-path')
+    if not chart_path:
+        if version == 'latest':
+            if deployment_type in helm_latest_versions:
+                version = helm_latest_versions[deployment_type]
+            else:
+                version = helm_latest_versions[deployment_type] = helm_lib.get_latest_version(chart_repo, chart_name)
+        chart_path = helm_lib.chart_cache_init(chart_name, version, chart_repo)
+    return namespace_name, release_name, repo_name, chart_name, version, spec, chart_path, chart_repo
+
+
+# if errors dict is provided, exceptions are stored in it by key instead of raised and the key is skipped
+def deploy_preprocess_specs(specs, helm_lib=None, errors=None):
     if not helm_lib:
         helm_lib = helm
     helm_latest_versions = {}
     preprocess_results = {}
     for key, spec in specs.items():
-        spec = {**spec}
-        deployment_spec = spec.pop('cwm-worker-deployment')
-        deployment_type = deployment_spec["type"]
-        assert deployment_type in config.DEPLOYMENT_TYPES, 'unknown deployment type: {}'.format(deployment_type)
-        if deployment_type == 'minio':
-            spec.setdefault('minio', {})['serveSingleProtocolPerPod'] = True
-        namespace_name = deployment_spec['namespace']
-        release_name = _get_release_name(namespace_name, deployment_type)
-        chart_repo = "https://raw.githubusercontent.com/CloudWebManage/cwm-worker-helm/master/cwm-worker-deployment-{}".format(deployment_type)
-        repo_name = "cwm-worker-deployment-{}".format(deployment_type)
-        chart_name = "cwm-worker-deployment-{deployment_type}".format(deployment_type=deployment_type)
-        version = deployment_spec.get('version', 'latest')
-        chart_path = deployment_spec.get('chart-path')
-        if not chart_path:
-            if version == 'latest':
-                if deployment_type in helm_latest_versions:
-                    version = helm_latest_versions[deployment_type]
-                else:
-                    version = helm_latest_versions[deployment_type] = helm_lib.get_latest_version(
-                        "https://raw.githubusercontent.com/CloudWebManage/cwm-worker-helm/master/cwm-worker-deployment-{}".format(deployment_type),
-                        'cwm-worker-deployment-{}'.format(deployment_type)
-                    )
-            chart_path = helm_lib.chart_cache_init(chart_name, version, chart_repo)
-        preprocess_results[key] = namespace_name, release_name, repo_name, chart_name, version, spec, chart_path, chart_repo
+        try:
+            preprocess_results[key] = _deploy_preprocess_spec(spec, helm_lib, helm_latest_versions)
+        except Exception as e:
+            if errors is None:
+                raise
+            errors[key] = e
     return preprocess_results
 
 
 # example timeout string: "5m0s"
+# the upgrade is skipped if the deployed release has the same fingerprint (chart version and values)
+# unless force is True
 def deploy(spec, dry_run=False, atomic_timeout_string=None, with_init=True, namespace_lib=None,
-           helm_lib=None, preprocess_result=None):
+           helm_lib=None, preprocess_result=None, force=False):
     if not namespace_lib:
         namespace_lib = namespace
     if not helm_lib:
@@ -84,6 +202,11 @@ def deploy(spec, dry_run=False, atomic_timeout_string=None, with_init=True, name
     if preprocess_result is None:
         preprocess_result = deploy_preprocess_specs({0: spec}, helm_lib=helm_lib)[0]
     namespace_name, release_name, repo_name, chart_name, version, spec, chart_path, chart_repo = preprocess_result
+    fingerprint = None
+    if not dry_run:
+        fingerprint = helm_lib.get_fingerprint(version, spec, chart_path=chart_path, chart_name=chart_name)
+        if not force and namespace_lib.get_release_fingerprint(namespace_name, release_name) == fingerprint:
+            return 'Release "{}" is up to date (fingerprint {}), skipped upgrade\n'.format(release_name, fingerprint)
     if with_init:
         namespace_lib.init(namespace_name, dry_run=dry_run)
     returncode, stdout, stderr = helm_lib.upgrade(
@@ -91,12 +214,46 @@ def deploy(spec, dry_run=False, atomic_timeout_string=None, with_init=True, name
         atomic_timeout_string=atomic_timeout_string, chart_path=chart_path, chart_repo=chart_repo
     )
     if returncode == 0:
+        if fingerprint:
+            try:
+                namespace_lib.set_release_fingerprint(namespace_name, release_name, fingerprint)
+            except Exception as e:
+                # the next deploy will not be skipped, but the deploy itself succeeded
+                print('WARNING: failed to set release fingerprint ({} {}: {})'.format(
+                    namespace_name, release_name, _get_error_message(e)), file=sys.stderr)
         return stdout
     else:
         raise Exception("Helm upgrade failed (returncode={})\nsdterr=\n{}\nstdout=\n{}".format(returncode, stdout, stderr))
 
 
-def deploy_external_service(spec, namespace_lib=None):
+# deploys many specs concurrently, specs is a dict of key -> spec
+# the specs are preprocessed once (latest version and chart cache are resolved once per deployment type)
+# then namespace init and helm upgrade of each spec run in a pool of up to max_workers threads
+# a failure of one spec doesn't stop the others, returns a dict of key -> result:
+#   {"success": True, "output": <helm upgrade output>} or {"success": False, "error": <error message>}
+def deploy_many(specs, max_workers=None, dry_run=False, atomic_timeout_string=None, with_init=True,
+                namespace_lib=None, helm_lib=None, force=False):
+    if not namespace_lib:
+        namespace_lib = namespace
+    if not helm_lib:
+        helm_lib = helm
+    if not max_workers:
+        max_workers = config.DEPLOY_MANY_MAX_WORKERS
+    errors = {}
+    preprocess_results = deploy_preprocess_specs(specs, helm_lib=helm_lib, errors=errors)
+    results = concurrency.run_each({
+        key: partial(deploy, None, dry_run=dry_run, atomic_timeout_string=atomic_timeout_string, with_init=with_init,
+                     namespace_lib=namespace_lib, helm_lib=helm_lib, preprocess_result=preprocess_result,
+                     force=force)
+        for key, preprocess_result in preprocess_results.items()
+    }, max_workers)
+    results.update({key: (False, e) for key, e in errors.items()})
+    return _get_many_results(specs.keys(), results, "output")
+
+
+# if server_side_apply is True the services are created or updated with namespace.apply_objects
+# and the apply results are returned
+def deploy_external_service(spec, namespace_lib=None, server_side_apply=False):
     if not namespace_lib:
         namespace_lib = namespace
     spec = {**spec}
@@ -104,11 +261,22 @@ def deploy_external_service(spec, namespace_lib=None):
     deployment_type = deployment_spec["type"]
     assert deployment_type in config.DEPLOYMENT_TYPES, 'unknown deployment type: {}'.format(deployment_type)
     namespace_name = deployment_spec['namespace']
+    if server_side_apply:
+        return namespace_lib.apply_objects(namespace_name, [
+            {
+                "apiVersion": "v1",
+                "kind": "Service",
+                "metadata": {"name": service["name"]},
+                "spec": service["spec"]
+            } for service in config.DEPLOYMENT_TYPES[deployment_type]["external_services"]
+        ])
     for service in config.DEPLOYMENT_TYPES[deployment_type]["external_services"]:
         namespace_lib.create_service(namespace_name, service)
 
 
-def deploy_extra_objects(spec, extra_objects, namespace_lib=None):
+# if server_side_apply is True the objects are created or updated with namespace.apply_objects
+# and the apply results are returned
+def deploy_extra_objects(spec, extra_objects, namespace_lib=None, server_side_apply=False):
     if not namespace_lib:
         namespace_lib = namespace
     namespace_name = spec['cwm-worker-deployment']['namespace']
@@ -120,20 +288,19 @@ def deploy_extra_objects(spec, extra_objects, namespace_lib=None):
             'metadata': {
                 'name': object['name']
             },
-            'spec': yaml.safe_load(object['spec'])
+            'spec': serialization.yaml_safe_load(object['spec'])
         })
+    if server_side_apply:
+        return namespace_lib.apply_objects(namespace_name, objects)
     namespace_lib.create_objects(namespace_name, objects)
 
 
-# example timeout string: "5m0s"
-def delete(namespace_name, deployment_type, timeout_string=None, dry_run=False, delete_namespace=False,
-           delete_helm=True, namespace_lib=None, helm_lib=None,
-           delete_data=False, delete_data_config=None, force_now=False):
-    if not namespace_lib:
-        namespace_lib = namespace
-    if not helm_lib:
-        helm_lib = helm
+def _delete_release(namespace_name, deployment_type, timeout_string, dry_run, delete_helm, namespace_lib, helm_lib,
+                    force_now):
     release_name = _get_release_name(namespace_name, deployment_type)
+    if not delete_helm and not dry_run:
+        # the release is kept, so its fingerprint must not cause the next deploy to skip recreating the deployments
+        namespace_lib.clear_release_fingerprint(namespace_name, release_name)
     if force_now or not delete_helm:
         for deletion in config.DEPLOYMENT_TYPES[deployment_type]["deletions"]:
             {
@@ -141,6 +308,10 @@ def delete(namespace_name, deployment_type, timeout_string=None, dry_run=False,
             }[deletion["type"]](namespace_name, deployment_type, deletion, namespace_lib, force_now=force_now)
     if delete_helm:
         helm_lib.delete(namespace_name, release_name, timeout_string=timeout_string, dry_run=dry_run)
+
+
+def _delete_data_namespace(namespace_name, deployment_type, dry_run, delete_namespace, namespace_lib, delete_data,
+                           delete_data_config):
     try:
         if delete_data:
             _delete_data(namespace_name, deployment_type, delete_data_config, namespace_lib)
@@ -149,9 +320,65 @@ def delete(namespace_name, deployment_type, timeout_string=None, dry_run=False,
             namespace_lib.delete(namespace_name, dry_run=dry_run)
 
 
-def is_ready(namespace_name, deployment_type, namespace_lib=None, enabledProtocols=None, minimal_check=False):
+# example timeout string: "5m0s"
+def delete(namespace_name, deployment_type, timeout_string=None, dry_run=False, delete_namespace=False,
+           delete_helm=True, namespace_lib=None, helm_lib=None,
+           delete_data=False, delete_data_config=None, force_now=False):
     if not namespace_lib:
         namespace_lib = namespace
+    if not helm_lib:
+        helm_lib = helm
+    _delete_release(namespace_name, deployment_type, timeout_string, dry_run, delete_helm, namespace_lib, helm_lib, force_now)
+    _delete_data_namespace(namespace_name, deployment_type, dry_run, delete_namespace, namespace_lib, delete_data, delete_data_config)
+
+
+# deletes many deployments concurrently, deletions is a dict of key -> delete kwargs, for example:
+#   {"key": {"namespace_name": "...", "deployment_type": "minio", "delete_namespace": True, ...}}
+# deployments and helm releases are deleted with up to max_workers threads
+# delete data and namespace deletion run in a separate pool of up to delete_data_max_workers threads, so that slow
+# delete data jobs don't hold up the deletion of other deployments
+# a failure of one deletion doesn't stop the others, returns a dict of key -> result:
+#   {"success": True} or {"success": False, "error": <error message>}
+def delete_many(deletions, max_workers=None, delete_data_max_workers=None, namespace_lib=None, helm_lib=None):
+    if not namespace_lib:
+        namespace_lib = namespace
+    if not helm_lib:
+        helm_lib = helm
+    if not max_workers:
+        max_workers = config.DELETE_MANY_MAX_WORKERS
+    if not delete_data_max_workers:
+        delete_data_max_workers = config.DELETE_MANY_DELETE_DATA_MAX_WORKERS
+    if not deletions:
+        return {}
+
+    def _delete(data_executor, namespace_name, deployment_type, timeout_string=None, dry_run=False,
+                delete_namespace=False, delete_helm=True, delete_data=False, delete_data_config=None, force_now=False):
+        _delete_release(namespace_name, deployment_type, timeout_string, dry_run, delete_helm, namespace_lib, helm_lib, force_now)
+        if delete_data or delete_namespace:
+            return data_executor.submit(
+                _delete_data_namespace, namespace_name, deployment_type, dry_run, delete_namespace, namespace_lib,
+                delete_data, delete_data_config
+            )
+        else:
+            return None
+
+    with ThreadPoolExecutor(max_workers=delete_data_max_workers) as data_executor:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(deletions))) as executor:
+            futures = {key: executor.submit(_delete, data_executor, **kwargs) for key, kwargs in deletions.items()}
+    results = {}
+    for key, future in futures.items():
+        try:
+            data_future = future.result()
+            if data_future:
+                data_future.result()
+        except Exception as e:
+            results[key] = (False, e)
+        else:
+            results[key] = (True, None)
+    return _get_many_results(deletions.keys(), results)
+
+
+def _get_readiness_checks(deployment_type, enabledProtocols=None, minimal_check=False):
     if not enabledProtocols:
         enabledProtocols = ['http', 'https']
     for readiness_check in config.DEPLOYMENT_TYPES[deployment_type]["readiness_checks"]:
@@ -159,41 +386,118 @@ def is_ready(namespace_name, deployment_type, namespace_lib=None, enabledProtoco
             continue
         if readiness_check.get('protocol') and readiness_check['protocol'] not in enabledProtocols:
             continue
-        res = {
+        yield readiness_check
+
+
+def _get_readiness_check_funcs(namespace_name, deployment_type, namespace_lib, enabledProtocols=None, minimal_check=False):
+    return [
+        partial({
             "deployment": _is_ready_deployment
-        }[readiness_check["type"]](namespace_name, deployment_type, readiness_check, namespace_lib)
-        if not res:
+        }[readiness_check["type"]], namespace_name, deployment_type, readiness_check, namespace_lib)
+        for readiness_check in _get_readiness_checks(deployment_type, enabledProtocols, minimal_check)
+    ]
+
+
+# when max_workers is set, all the readiness checks run concurrently instead of one by one
+def is_ready(namespace_name, deployment_type, namespace_lib=None, enabledProtocols=None, minimal_check=False,
+             max_workers=None):
+    if not namespace_lib:
+        namespace_lib = namespace
+    readiness_check_funcs = _get_readiness_check_funcs(namespace_name, deployment_type, namespace_lib, enabledProtocols, minimal_check)
+    if max_workers:
+        return all(concurrency.run_all(readiness_check_funcs, max_workers))
+    for readiness_check_func in readiness_check_funcs:
+        if not readiness_check_func():
             return False
     return True
 
 
+# starts a watch-based cache of the deployments used in the readiness checks of the given deployment types
+# while it's running, is_ready answers from memory instead of reading each deployment status from the cluster
+def start_readiness_cache(deployment_types=None, namespace_lib=None, **kwargs):
+    if not namespace_lib:
+        namespace_lib = namespace
+    if deployment_types is None:
+        deployment_types = list(config.DEPLOYMENT_TYPES.keys())
+    deployment_names = set()
+    for deployment_type in deployment_types:
+        for readiness_check in config.DEPLOYMENT_TYPES[deployment_type]["readiness_checks"]:
+            if readiness_check["type"] == "deployment":
+                deployment_names.add(readiness_check["deployment_name"])
+    return namespace_lib.start_deployment_status_cache(deployment_names, **kwargs)
+
+
+def stop_readiness_cache(namespace_lib=None):
+    if not namespace_lib:
+        namespace_lib = namespace
+    namespace_lib.stop_deployment_status_cache()
+
+
 def get_metrics(namespace_name, deployment_type, namespace_lib=None):
     if not namespace_lib:
         namespace_lib = namespace
-    metrics = {}
-    for metrics_check in config.DEPLOYMENT_TYPES[deployment_type]["metrics_checks"]:
-        metrics[metrics_check['name']] = {
-            "namespace_prometheus_rate_query": _get_metrics_namespace_prometheus_rate_query
-        }[metrics_check["type"]](namespace_name, deployment_type, metrics_check, namespace_lib)
-    return metrics
+    metrics_checks = config.DEPLOYMENT_TYPES[deployment_type]["metrics_checks"]
+    metrics_checks_by_type = {}
+    for metrics_check in metrics_checks:
+        metrics_checks_by_type.setdefault(metrics_check["type"], []).append(metrics_check)
+    values = {}
+    for metrics_check_type, type_metrics_checks in metrics_checks_by_type.items():
+        values.update({
+            "namespace_prometheus_rate_query": _get_metrics_namespace_prometheus_rate_queries
+        }[metrics_check_type](namespace_name, deployment_type, type_metrics_checks, namespace_lib))
+    return {metrics_check['name']: values[metrics_check['name']] for metrics_check in metrics_checks}
+
+
+# returns a dict of namespace_name -> metrics, with the same metrics as get_metrics
+# each metrics check type is queried once for all the namespaces
+def get_metrics_bulk(namespace_names, deployment_type, namespace_lib=None):
+    if not namespace_lib:
+        namespace_lib = namespace
+    metrics_checks = config.DEPLOYMENT_TYPES[deployment_type]["metrics_checks"]
+    metrics_checks_by_type = {}
+    for metrics_check in metrics_checks:
+        metrics_checks_by_type.setdefault(metrics_check["type"], []).append(metrics_check)
+    values = {namespace_name: {} for namespace_name in namespace_names}
+    for metrics_check_type, type_metrics_checks in metrics_checks_by_type.items():
+        type_values = {
+            "namespace_prometheus_rate_query": _get_metrics_bulk_namespace_prometheus_rate_queries
+        }[metrics_check_type](namespace_names, deployment_type, type_metrics_checks, namespace_lib)
+        for namespace_name, namespace_values in type_values.items():
+            values[namespace_name].update(namespace_values)
+    return {
+        namespace_name: {metrics_check['name']: namespace_values[metrics_check['name']] for metrics_check in metrics_checks}
+        for namespace_name, namespace_values in values.items()
+    }
 
 
-def details(namespace_name, deployment_type, helm_lib=None, namespace_lib=None):
+# when max_workers is set, the release details, each readiness check and the metrics run concurrently
+def details(namespace_name, deployment_type, helm_lib=None, namespace_lib=None, max_workers=None):
     if not helm_lib:
         helm_lib = helm
     if not namespace_lib:
         namespace_lib = namespace
     release_name = _get_release_name(namespace_name, deployment_type)
-    release_details = helm_lib.get_release_details(namespace_name, release_name)
+    if max_workers:
+        readiness_check_funcs = _get_readiness_check_funcs(namespace_name, deployment_type, namespace_lib)
+        release_details, metrics, *readiness_check_results = concurrency.run_all([
+            partial(helm_lib.get_release_details, namespace_name, release_name),
+            partial(get_metrics, namespace_name, deployment_type, namespace_lib=namespace_lib),
+            *readiness_check_funcs
+        ], max_workers)
+        ready = all(readiness_check_results)
+    else:
+        release_details = helm_lib.get_release_details(namespace_name, release_name)
+        ready = is_ready(namespace_name, deployment_type, namespace_lib=namespace_lib)
+        metrics = get_metrics(namespace_name, deployment_type, namespace_lib=namespace_lib)
     return {
         "name": release_name,
-        "ready": is_ready(namespace_name, deployment_type, namespace_lib=namespace_lib),
+        "ready": ready,
         "app_version": release_details["app_version"],
         "chart": release_details["chart"],
         "revision": release_details["revision"],
         "status": release_details["status"],
         "updated": release_details["updated"],
-        "metrics": get_metrics(namespace_name, deployment_type, namespace_lib=namespace_lib),
+        "metrics": metrics,
     }
 
 
@@ -227,79 +531,153 @@ def get_container_status_state(state):
     return res
 
 
-def get_health(namespace_name, deployment_type, namespace_lib=None):
-    if not namespace_lib:
-        namespace_lib = namespace
-    namespace_obj = namespace_lib.get_namespace(namespace_name)
-    if namespace_obj:
-        deployments_output = {
-            deployment_name: {
-                'deployments': [],
-                'pods': []
-            }
-            for deployment_name in config.DEPLOYMENT_TYPES[deployment_type]['health']['deployments'].keys()
-        }
-        deployments_output['unknown'] = {
+# label selector which matches the pods of all the health deployments of the given deployment type
+def get_health_label_selector(deployment_type):
+    return 'app in ({})'.format(','.join(sorted(
+        deployment_config['matchLabelsApp']
+        for deployment_config in config.DEPLOYMENT_TYPES[deployment_type]['health']['deployments'].values()
+    )))
+
+
+def _get_health(namespace_obj, pods, deployments, is_ready_result, deployment_type):
+    deployments_output = {
+        deployment_name: {
             'deployments': [],
             'pods': []
         }
-        for pod in namespace_lib.get_pods(namespace_name):
-            pod_deployment_name = 'unknown'
-            for deployment_name, deployment_config in config.DEPLOYMENT_TYPES[deployment_type]['health']['deployments'].items():
-                if deployment_config['matchLabelsApp'] == pod['metadata'].get('labels', {}).get('app'):
-                    pod_deployment_name = deployment_name
-                    break
-            deployments_output[pod_deployment_name]['pods'].append({
-                'name': pod['metadata']['name'],
-                'phase': pod['status'].get('phase'),
-                'conditions': {
-                    c['type']: '{}{}'.format(c['status'], ':{}'.format(c['reason']) if c.get('reason') else '')
-                    for c in pod['status'].get('conditions', [])
-                },
-                'containerStatuses': {
-                    cs['name']: {
-                        'ready': cs.get('ready'),
-                        'restartCount': cs.get('restartCount'),
-                        'started': cs.get('started'),
-                        'state': get_container_status_state(cs.get('state')),
-                    }
-                    for cs in pod['status'].get('containerStatuses', [])
-                },
-                'nodeName': pod['spec'].get('nodeName')
-            })
-        for deployment in namespace_lib.get_deployments(namespace_name):
-            dn = 'unknown'
-            for deployment_name, deployment_config in config.DEPLOYMENT_TYPES[deployment_type]['health']['deployments'].items():
-                if deployment_config['matchLabelsApp'] == deployment['spec'].get('selector', {}).get('matchLabels', {}).get('app'):
-                    dn = deployment_name
-                    break
-            deployments_output[dn]['deployments'].append({
-                'name': deployment['metadata']['name'],
-                'replicas': {
-                    'replicas': deployment['status'].get('replicas'),
-                    'updated': deployment['status'].get('updatedReplicas'),
-                    'ready': deployment['status'].get('readyReplicas'),
-                    'available': deployment['status'].get('availableReplicas'),
-                },
-                'conditions': {
-                    c['type']: '{}{}'.format(c['status'], ':{}'.format(c['reason']) if c.get('reason') else '')
-                    for c in deployment['status'].get('conditions', [])
+        for deployment_name in config.DEPLOYMENT_TYPES[deployment_type]['health']['deployments'].keys()
+    }
+    deployments_output['unknown'] = {
+        'deployments': [],
+        'pods': []
+    }
+    for pod in pods:
+        pod_deployment_name = 'unknown'
+        for deployment_name, deployment_config in config.DEPLOYMENT_TYPES[deployment_type]['health']['deployments'].items():
+            if deployment_config['matchLabelsApp'] == pod['metadata'].get('labels', {}).get('app'):
+                pod_deployment_name = deployment_name
+                break
+        deployments_output[pod_deployment_name]['pods'].append({
+            'name': pod['metadata']['name'],
+            'phase': pod['status'].get('phase'),
+            'conditions': {
+                c['type']: '{}{}'.format(c['status'], ':{}'.format(c['reason']) if c.get('reason') else '')
+                for c in pod['status'].get('conditions', [])
+            },
+            'containerStatuses': {
+                cs['name']: {
+                    'ready': cs.get('ready'),
+                    'restartCount': cs.get('restartCount'),
+                    'started': cs.get('started'),
+                    'state': get_container_status_state(cs.get('state')),
                 }
-            })
-        if len(deployments_output['unknown']['pods']) == 0 and len(deployments_output['unknown']['deployments']) == 0:
-            del deployments_output['unknown']
-        return {
-            'is_ready': is_ready(namespace_name, deployment_type, namespace_lib=namespace_lib),
-            'namespace': {
-                'name': namespace_obj['metadata']['name'],
-                'phase': namespace_obj['status']['phase']
+                for cs in pod['status'].get('containerStatuses', [])
             },
-            'deployments': deployments_output
-        }
+            'nodeName': pod['spec'].get('nodeName')
+        })
+    for deployment in deployments:
+        dn = 'unknown'
+        for deployment_name, deployment_config in config.DEPLOYMENT_TYPES[deployment_type]['health']['deployments'].items():
+            if deployment_config['matchLabelsApp'] == deployment['spec'].get('selector', {}).get('matchLabels', {}).get('app'):
+                dn = deployment_name
+                break
+        deployments_output[dn]['deployments'].append({
+            'name': deployment['metadata']['name'],
+            'replicas': {
+                'replicas': deployment['status'].get('replicas'),
+                'updated': deployment['status'].get('updatedReplicas'),
+                'ready': deployment['status'].get('readyReplicas'),
+                'available': deployment['status'].get('availableReplicas'),
+            },
+            'conditions': {
+                c['type']: '{}{}'.format(c['status'], ':{}'.format(c['reason']) if c.get('reason') else '')
+                for c in deployment['status'].get('conditions', [])
+            }
+        })
+    if len(deployments_output['unknown']['pods']) == 0 and len(deployments_output['unknown']['deployments']) == 0:
+        del deployments_output['unknown']
+    return {
+        'is_ready': is_ready_result,
+        'namespace': {
+            'name': namespace_obj['metadata']['name'],
+            'phase': namespace_obj['status']['phase']
+        },
+        'deployments': deployments_output
+    }
+
+
+# when max_workers is set, the namespace, pods, deployments and each readiness check are read concurrently
+def get_health(namespace_name, deployment_type, namespace_lib=None, max_workers=None):
+    if not namespace_lib:
+        namespace_lib = namespace
+    if max_workers:
+        namespace_obj, pods, deployments, *readiness_check_results = concurrency.run_all([
+            partial(namespace_lib.get_namespace, namespace_name),
+            partial(namespace_lib.get_pods, namespace_name),
+            partial(namespace_lib.get_deployments, namespace_name),
+            *_get_readiness_check_funcs(namespace_name, deployment_type, namespace_lib)
+        ], max_workers)
+        if namespace_obj:
+            return _get_health(namespace_obj, pods, deployments, all(readiness_check_results), deployment_type)
+        else:
+            return None
+    namespace_obj = namespace_lib.get_namespace(namespace_name)
+    if namespace_obj:
+        return _get_health(
+            namespace_obj, namespace_lib.get_pods(namespace_name), namespace_lib.get_deployments(namespace_name),
+            is_ready(namespace_name, deployment_type, namespace_lib=namespace_lib), deployment_type
+        )
     else:
         return None
 
 
+# answers is_ready from a list of deployments instead of reading the deployment status from the cluster
+class _DeploymentsSnapshotReadiness:
+
+    def __init__(self, deployments):
+        self._ready_replicas = {
+            (deployment['metadata']['namespace'], deployment['metadata']['name']): deployment.get('status', {}).get('readyReplicas')
+            for deployment in deployments
+        }
+
+    def is_ready_deployment(self, namespace_name, deployment_name):
+        ready_replicas = self._ready_replicas.get((namespace_name, deployment_name))
+        return bool(ready_replicas and ready_replicas > 0)
+
+
+# returns a dict of namespace_name -> get_health result for each of the given namespaces
+# namespaces, pods and deployments are listed once for all namespaces and indexed by namespace
+# label_selector is applied to the pods and deployments lists, note that get_health_label_selector only matches the
+# pods / deployments labels, so objects without matching labels will not be included (not even as unknown)
+def get_health_bulk(namespace_names, deployment_type, namespace_lib=None, label_selector=None):
+    if not namespace_lib:
+        namespace_lib = namespace
+    namespace_names = set(namespace_names)
+    namespace_objs, pods, deployments = {}, {}, {}
+    for namespace_obj in namespace_lib.get_namespaces():
+        if namespace_obj['metadata']['name'] in namespace_names:
+            namespace_objs[namespace_obj['metadata']['name']] = namespace_obj
+    for pod in namespace_lib.get_all_pods(label_selector=label_selector):
+        if pod['metadata']['namespace'] in namespace_objs:
+            pods.setdefault(pod['metadata']['namespace'], []).append(pod)
+    for deployment in namespace_lib.get_all_deployments(label_selector=label_selector):
+        if deployment['metadata']['namespace'] in namespace_objs:
+            deployments.setdefault(deployment['metadata']['namespace'], []).append(deployment)
+    res = {}
+    for namespace_name in namespace_names:
+        namespace_obj = namespace_objs.get(namespace_name)
+        if namespace_obj:
+            namespace_deployments = deployments.get(namespace_name, [])
+            res[namespace_name] = _get_health(
+                namespace_obj, pods.get(namespace_name, []), namespace_deployments,
+                is_ready(namespace_name, deployment_type, namespace_lib=_DeploymentsSnapshotReadiness(namespace_deployments)),
+                deployment_type
+            )
+        else:
+            res[namespace_name] = None
+    return res
+
+
 if __name__ == '__main__':
     import sys
     if sys.argv[1] == 'test_deploy_extra_objects':
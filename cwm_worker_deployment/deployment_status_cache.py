@@ -0,0 +1,117 @@
+import time
+import threading
+import traceback
+
+
+# Keeps the ready replicas of deployments with the given names (in all namespaces) in memory
+# each deployment name is listed once and then kept up to date with a watch, resuming from the last resourceVersion
+# when the watch resourceVersion is too old (410 Gone) the deployments are listed again
+class DeploymentStatusCache:
+
+    def __init__(self, deployment_names, list_func, watch_timeout_seconds=300, retry_seconds=5, watch_class=None):
+        # list_func should list deployments in all namespaces (e.g. appsV1Api.list_deployment_for_all_namespaces)
+        self.deployment_names = set(deployment_names)
+        self._list_func = list_func
+        self._watch_timeout_seconds = watch_timeout_seconds
+        self._retry_seconds = retry_seconds
+        if watch_class is None:
+            from kubernetes import watch
+            watch_class = watch.Watch
+        self._watch_class = watch_class
+        self._lock = threading.Lock()
+        self._ready_replicas = {}
+        self._synced_deployment_names = set()
+        self._stop_event = threading.Event()
+        self._watches = []
+        self._threads = []
+
+    def start(self):
+        for deployment_name in self.deployment_names:
+            thread = threading.Thread(target=self._run, args=(deployment_name,), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop_event.set()
+        with self._lock:
+            for w in self._watches:
+                w.stop()
+
+    def wait_synced(self, timeout_seconds=None):
+        start_time = time.time()
+        while not all(self.is_synced(deployment_name) for deployment_name in self.deployment_names):
+            if timeout_seconds is not None and time.time() - start_time > timeout_seconds:
+                return False
+            time.sleep(0.1)
+        return True
+
+    def is_synced(self, deployment_name):
+        with self._lock:
+            return deployment_name in self._synced_deployment_names
+
+    # returns None if the deployment name is not cached or the cache is not synced yet
+    def is_ready_deployment(self, namespace_name, deployment_name):
+        with self._lock:
+            if deployment_name not in self._synced_deployment_names:
+                return None
+            ready_replicas = self._ready_replicas.get((namespace_name, deployment_name))
+        return bool(ready_replicas and ready_replicas > 0)
+
+    def _relist(self, deployment_name):
+        res = self._list_func(field_selector='metadata.name={}'.format(deployment_name))
+        with self._lock:
+            for key in [key for key in self._ready_replicas if key[1] == deployment_name]:
+                del self._ready_replicas[key]
+            for deployment in res.items:
+                self._set_deployment(deployment)
+            self._synced_deployment_names.add(deployment_name)
+        return res.metadata.resource_version
+
+    def _set_deployment(self, deployment):
+        self._ready_replicas[(deployment.metadata.namespace, deployment.metadata.name)] = deployment.status.ready_replicas if deployment.status else None
+
+    def _handle_event(self, event):
+        deployment = event['object']
+        with self._lock:
+            if event['type'] == 'DELETED':
+                self._ready_replicas.pop((deployment.metadata.namespace, deployment.metadata.name), None)
+            else:
+                self._set_deployment(deployment)
+        return deployment.metadata.resource_version
+
+    def _watch(self, deployment_name, resource_version):
+        w = self._watch_class()
+        with self._lock:
+            self._watches.append(w)
+        try:
+            for event in w.stream(self._list_func, field_selector='metadata.name={}'.format(deployment_name),
+                                  resource_version=resource_version, timeout_seconds=self._watch_timeout_seconds):
+                if self._stop_event.is_set():
+                    break
+                if event['type'] == 'ERROR':
+                    if event['raw_object'].get('code') == 410:
+                        return None
+                    raise Exception('watch error: {}'.format(event['raw_object']))
+                if event['type'] in ('ADDED', 'MODIFIED', 'DELETED'):
+                    resource_version = self._handle_event(event)
+            return resource_version
+        finally:
+            with self._lock:
+                self._watches.remove(w)
+
+    def _run(self, deployment_name):
+        from kubernetes.client.rest import ApiException
+        resource_version = None
+        while not self._stop_event.is_set():
+            try:
+                if resource_version is None:
+                    resource_version = self._relist(deployment_name)
+                resource_version = self._watch(deployment_name, resource_version)
+            except Exception as e:
+                resource_version = None
+                if not isinstance(e, ApiException) or e.status != 410:
+                    # until the next successful list, is_ready_deployment falls back to reading from the cluster
+                    with self._lock:
+                        self._synced_deployment_names.discard(deployment_name)
+                    traceback.print_exc()
+                    self._stop_event.wait(self._retry_seconds)
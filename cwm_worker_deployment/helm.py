@@ -1,44 +1,188 @@
 import os
+import sys
 import json
-import requests
+import time
+import bisect
+import hashlib
+import threading
 import datetime
 import subprocess
 import tempfile
-from ruamel import yaml
+import contextlib
+
+import requests
 
 from cwm_worker_deployment import config
+from cwm_worker_deployment import chart_cache
+from cwm_worker_deployment import http_session
+from cwm_worker_deployment import serialization
+
+
+REPO_INDEX_CACHE_DIR_NAME = '_repo_index'
+
+# in-memory memo of get_repo_versions, dict of repo_url -> (revision, versions)
+_repo_versions = {}
+_repo_versions_lock = threading.Lock()
+
+# session without retries which is used to revalidate a cached repo index, see _update_repo_index_cache
+_revalidate_session = None
+_revalidate_session_lock = threading.Lock()
+
+
+def _get_repo_index_cache_path(repo_url):
+    return os.path.join(config.CWM_WORKER_DEPLOYMENT_HELM_CACHE_DIR, REPO_INDEX_CACHE_DIR_NAME,
+                        hashlib.sha256(repo_url.encode()).hexdigest())
+
+
+def _write_file_atomic(path, content):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+def _get_revalidate_session():
+    global _revalidate_session
+    with _revalidate_session_lock:
+        if _revalidate_session is None:
+            _revalidate_session = http_session.create_session(pool_connections=1, retries=0)
+        return _revalidate_session
+
+
+# makes sure the repo index.yaml cached on disk under the helm cache dir is up to date and returns its metadata
+# the cached index is used for config.HELM_REPO_INDEX_CACHE_TTL_SECONDS, then it's revalidated with a conditional
+# request (ETag / Last-Modified), if the request fails the stale cached index is used
+# the revalidation request is not retried so that a slow repo doesn't delay using the stale cached index, and after
+# a failure the stale cached index is used until the next TTL without trying to revalidate it on every call
+# metadata revision is the sha256 of the index content, it changes only when the index content changes
+def _update_repo_index_cache(repo_url):
+    cache_path = _get_repo_index_cache_path(repo_url)
+    index_path, metadata_path = os.path.join(cache_path, 'index.yaml'), os.path.join(cache_path, 'metadata.json')
+    try:
+        with open(metadata_path) as f:
+            metadata = json.load(f)
+        if not metadata.get('revision') or not os.path.exists(index_path):
+            metadata = None
+    except (OSError, ValueError):
+        metadata = None
+    if metadata and time.time() - metadata['fetched_at'] < config.HELM_REPO_INDEX_CACHE_TTL_SECONDS:
+        return metadata
+    headers = {}
+    if metadata and metadata.get('etag'):
+        headers['If-None-Match'] = metadata['etag']
+    if metadata and metadata.get('last_modified'):
+        headers['If-Modified-Since'] = metadata['last_modified']
+    session = _get_revalidate_session() if metadata else http_session.get_session()
+    try:
+        res = session.get("{}/index.yaml".format(repo_url), headers=headers, timeout=config.HELM_REPO_INDEX_TIMEOUT_SECONDS)
+        if res.status_code != 304 or not metadata:
+            res.raise_for_status()
+    except requests.RequestException:
+        if metadata:
+            print('WARNING: failed to fetch helm repo index, using stale cached index ({})'.format(repo_url), file=sys.stderr)
+            metadata = {**metadata, 'fetched_at': time.time()}
+            _write_file_atomic(metadata_path, json.dumps(metadata).encode())
+            return metadata
+        raise
+    os.makedirs(cache_path, exist_ok=True)
+    if res.status_code == 200:
+        metadata = {
+            'etag': res.headers.get('ETag'),
+            'last_modified': res.headers.get('Last-Modified'),
+            'revision': hashlib.sha256(res.content).hexdigest()
+        }
+        _write_file_atomic(index_path, res.content)
+    metadata = {**metadata, 'fetched_at': time.time()}
+    _write_file_atomic(metadata_path, json.dumps(metadata).encode())
+    return metadata
+
 
+def _read_repo_index_content(repo_url):
+    with open(os.path.join(_get_repo_index_cache_path(repo_url), 'index.yaml'), 'rb') as f:
+        return f.read()
 
-def get_latest_version(repo_url, chart_name):
-    repo_index = yaml.safe_load(requests.get("{}/index.yaml".format(repo_url), timeout=15).content)
-    latest_entry_datetime = None
-    latest_entry_version = None
-    for entry in repo_index['entries'][chart_name]:
-        if entry['version'].startswith('0.0.0-'):
-            entry_datetime = datetime.datetime.strptime(entry['version'].replace('0.0.0-', ''), '%Y%m%dT%H%M%S')
-            if latest_entry_datetime is None or latest_entry_datetime < entry_datetime:
-                latest_entry_datetime = entry_datetime
-                latest_entry_version = entry['version']
-    assert latest_entry_version, 'failed to find latest version ({} {})'.format(repo_url, chart_name)
-    return latest_entry_version
+
+def get_repo_index_content(repo_url):
+    _update_repo_index_cache(repo_url)
+    return _read_repo_index_content(repo_url)
+
+
+def _get_repo_index_versions(repo_index):
+    versions = {}
+    for chart_name, entries in repo_index['entries'].items():
+        chart_versions = set()
+        for entry in entries:
+            if entry['version'].startswith('0.0.0-'):
+                # validates the version datetime format, versions with this format can be sorted as strings
+                datetime.datetime.strptime(entry['version'].replace('0.0.0-', ''), '%Y%m%dT%H%M%S')
+                chart_versions.add(entry['version'])
+        versions[chart_name] = sorted(chart_versions)
+    return versions
+
+
+# returns a dict of chart_name -> sorted list of the 0.0.0-YYYYMMDDTHHMMSS versions in the repo index
+# it's built once per index revision and stored next to the cached index (versions.json), so the index
+# only needs to be parsed when it changes
+def get_repo_versions(repo_url):
+    revision = _update_repo_index_cache(repo_url)['revision']
+    with _repo_versions_lock:
+        memo = _repo_versions.get(repo_url)
+    if memo and memo[0] == revision:
+        return memo[1]
+    versions_path = os.path.join(_get_repo_index_cache_path(repo_url), 'versions.json')
+    try:
+        with open(versions_path) as f:
+            versions_data = json.load(f)
+    except (OSError, ValueError):
+        versions_data = None
+    if not versions_data or versions_data['revision'] != revision:
+        content = _read_repo_index_content(repo_url)
+        versions_data = {
+            # the index file might have been updated by another process since the metadata was read
+            'revision': hashlib.sha256(content).hexdigest(),
+            'versions': _get_repo_index_versions(serialization.yaml_safe_load(content))
+        }
+        _write_file_atomic(versions_path, json.dumps(versions_data).encode())
+    with _repo_versions_lock:
+        _repo_versions[repo_url] = versions_data['revision'], versions_data['versions']
+    return versions_data['versions']
+
+
+# returns the latest 0.0.0-YYYYMMDDTHHMMSS version, if before datetime is set, returns the latest version before it
+def get_latest_version(repo_url, chart_name, before=None):
+    chart_versions = get_repo_versions(repo_url).get(chart_name, [])
+    if before:
+        chart_versions = chart_versions[:bisect.bisect_left(chart_versions, '0.0.0-{}'.format(before.strftime('%Y%m%dT%H%M%S')))]
+    assert chart_versions, 'failed to find latest version ({} {})'.format(repo_url, chart_name)
+    return chart_versions[-1]
 
 
 def chart_cache_init(chart_name, version, chart_repo):
-    chart_cache_path = os.path.join(config.CWM_WORKER_DEPLOYMENT_HELM_CACHE_DIR, chart_name, version)
-    if not os.path.exists(chart_cache_path):
-        cmd = ["helm", "pull", chart_name, "--repo", chart_repo, "--untar", "--untardir", chart_cache_path, "--version",
-               version]
-        subprocess.check_call(cmd)
-    return os.path.join(chart_cache_path, chart_name)
+    return chart_cache.init(chart_name, version, chart_repo)
+
+
+def _is_chart_cache_path(chart_name, version, chart_path):
+    return chart_path == os.path.join(chart_cache.get_chart_cache_path(chart_name, version), chart_name)
+
+
+def _get_chart_path_context(chart_name, version, chart_path, chart_repo):
+    if chart_path and not _is_chart_cache_path(chart_name, version, chart_path):
+        return contextlib.nullcontext(chart_path)
+    else:
+        # the cached chart version is used while holding a shared lock, so it won't be evicted by chart_cache.gc
+        return chart_cache.use(chart_name, version, chart_repo)
 
 
 # example timeout string: "5m0s"
 def upgrade(release_name, repo_name, chart_name, namespace_name, version, values, atomic_timeout_string=None,
             dry_run=False, chart_path=None, chart_repo=None, dry_run_debug=True):
-    if not chart_path:
-        chart_path = chart_cache_init(chart_name, version, chart_repo)
-    with tempfile.NamedTemporaryFile("w") as f:
-        yaml.safe_dump(values, f)
+    with _get_chart_path_context(chart_name, version, chart_path, chart_repo) as chart_path, tempfile.NamedTemporaryFile("w", suffix=".yaml") as f:
+        serialization.dump_values(values, f)
+        f.flush()
         if dry_run and dry_run_debug:
             print(json.dumps(values))
         cmd = ["helm", "upgrade", "--install", "--namespace", namespace_name, "--version", version, "-f", f.name, release_name, chart_path]
@@ -50,6 +194,21 @@ def upgrade(release_name, repo_name, chart_name, namespace_name, version, values
         return result.returncode, result.stdout.decode(), result.stderr.decode()
 
 
+def _get_values_hash(values):
+    return hashlib.sha256(json.dumps(values, sort_keys=True, separators=(',', ':'), default=str).encode()).hexdigest()
+
+
+# fingerprint of the chart version, chart path and values of a release, used to skip upgrades which don't change anything
+# the chart path is only included if it was set explicitly, the chart cache path of the version is not included
+# so that changing the chart cache dir doesn't change the fingerprint of all the releases
+# the chart contents are not hashed, so changes to a local chart path are not detected
+# it is truncated to 63 characters so that it can be used as a label value
+def get_fingerprint(version, values, chart_path=None, chart_name=None):
+    if chart_path and chart_name and _is_chart_cache_path(chart_name, version, chart_path):
+        chart_path = None
+    return _get_values_hash({"version": version, "chart_path": chart_path or '', "values": values})[:63]
+
+
 def delete(namespace_name, release_name, timeout_string=None, dry_run=False):
     cmd = ["helm", "delete", "--namespace", namespace_name, release_name]
     if timeout_string:
@@ -66,19 +225,38 @@ def delete(namespace_name, release_name, timeout_string=None, dry_run=False):
             raise Exception(result.stderr.decode())
 
 
-def get_release_details(namespace_name, release_name):
+# if from_secrets is True (default from HELM_RELEASES_FROM_SECRETS env var), the release is read directly from
+# the helm release secrets instead of running the helm cli, see helm_releases
+def get_release_details(namespace_name, release_name, from_secrets=None):
+    if from_secrets is None:
+        from_secrets = config.HELM_RELEASES_FROM_SECRETS
+    if from_secrets:
+        from cwm_worker_deployment import helm_releases
+        return helm_releases.get_release_details(namespace_name, release_name)
     cmd = ["helm", "list", "--namespace", namespace_name, "--filter", "^{}$".format(release_name), "-o", "json"]
     items = json.loads(subprocess.check_output(cmd))
     assert len(items) == 1
     return items[0]
 
 
-def get_release_history(namespace_name, release_name):
+def get_release_history(namespace_name, release_name, from_secrets=None):
+    if from_secrets is None:
+        from_secrets = config.HELM_RELEASES_FROM_SECRETS
+    if from_secrets:
+        from cwm_worker_deployment import helm_releases
+        return helm_releases.get_release_history(namespace_name, release_name)
     cmd = ["helm", "history", "--namespace", namespace_name, release_name, "-o", "json"]
     return json.loads(subprocess.check_output(cmd))
 
 
-def iterate_all_releases(release_name, max_per_page=256):
+# if use_index is True, the releases are read directly from the helm release secrets (see helm_releases)
+# instead of paging through helm ls, the updated field is formatted from the stored timestamp
+def iterate_all_releases(release_name, max_per_page=256, use_index=False):
+    if use_index:
+        from cwm_worker_deployment import helm_releases
+        for release in helm_releases.get_release_index().iterate(release_name, statuses=helm_releases.HELM_LS_DEFAULT_STATUSES):
+            yield release.to_dict()
+        return
     assert max_per_page <= 256
     offset = 0
     while True:
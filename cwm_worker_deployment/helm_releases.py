@@ -0,0 +1,198 @@
+import re
+import gzip
+import json
+import base64
+import threading
+from collections import OrderedDict
+
+from cwm_worker_deployment import config
+from cwm_worker_deployment import namespace
+
+
+# label selector of the secrets which helm uses to store releases (helm storage driver "secret")
+HELM_RELEASE_SECRETS_LABEL_SELECTOR = 'owner=helm'
+
+# statuses of releases which helm ls shows by default
+HELM_LS_DEFAULT_STATUSES = ('deployed', 'failed')
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+# LRU cache of decoded release bodies, keyed by (namespace, secret name, resourceVersion)
+# a secret with the same resourceVersion didn't change, so it doesn't need to be decoded again
+_release_bodies = OrderedDict()
+_release_bodies_lock = threading.Lock()
+
+
+# decodes the release data of a helm release secret
+# the secret data value is base64 encoded (by kubernetes) of a base64 encoded (by helm) gzipped release json
+def decode_release(secret_release_data):
+    data = base64.b64decode(base64.b64decode(secret_release_data))
+    if data[:2] == GZIP_MAGIC:
+        data = gzip.decompress(data)
+    return json.loads(data)
+
+
+# formats an RFC3339 timestamp like golang time.Time.String() which is used by the helm cli json output
+# e.g. 2021-05-05T10:11:12.123450Z -> 2021-05-05 10:11:12.12345 +0000 UTC
+def format_helm_time(timestamp):
+    if not timestamp:
+        return ''
+    match = re.match(r'^(\d{4}-\d{2}-\d{2})T(\d{2}:\d{2}:\d{2})(\.\d+)?(Z|[+-]\d{2}:\d{2})$', timestamp)
+    if not match:
+        return timestamp
+    date, time, fraction, offset = match.groups()
+    fraction = (fraction or '').rstrip('0').rstrip('.')
+    if offset == 'Z':
+        offset, zone = '+0000', 'UTC'
+    else:
+        offset = zone = offset.replace(':', '')
+    return '{} {}{} {} {}'.format(date, time, fraction, offset, zone)
+
+
+# a single release revision, the metadata is parsed from the secret labels, the release body is decoded lazily
+class Release:
+
+    def __init__(self, secret):
+        labels = secret['metadata'].get('labels') or {}
+        self.namespace = secret['metadata']['namespace']
+        self.name = labels['name']
+        self.status = labels.get('status')
+        self.revision = int(labels.get('version', '0'))
+        self.secret_name = secret['metadata'].get('name')
+        self.resource_version = secret['metadata'].get('resourceVersion')
+        self._release_data = (secret.get('data') or {}).get('release')
+        self._body = None
+
+    @property
+    def body(self):
+        if self._body is None:
+            key = (self.namespace, self.secret_name, self.resource_version)
+            with _release_bodies_lock:
+                body = _release_bodies.get(key) if self.resource_version else None
+                if body is not None:
+                    _release_bodies.move_to_end(key)
+            if body is None:
+                body = decode_release(self._release_data)
+                if self.resource_version:
+                    with _release_bodies_lock:
+                        _release_bodies[key] = body
+                        while len(_release_bodies) > config.HELM_RELEASES_CACHE_MAX_SIZE:
+                            _release_bodies.popitem(last=False)
+            self._body = body
+        return self._body
+
+    @property
+    def chart_name(self):
+        return self.body['chart']['metadata']['name']
+
+    @property
+    def chart_version(self):
+        return self.body['chart']['metadata']['version']
+
+    @property
+    def app_version(self):
+        return self.body['chart']['metadata'].get('appVersion', '')
+
+    # same format as the items of helm ls -o json
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'namespace': self.namespace,
+            'revision': str(self.revision),
+            'updated': format_helm_time(self.body['info'].get('last_deployed')),
+            'status': self.status,
+            'chart': '{}-{}'.format(self.chart_name, self.chart_version),
+            'app_version': self.app_version,
+        }
+
+    # same format as the items of helm history -o json, which has the updated timestamp in RFC3339 format
+    def to_history_dict(self):
+        return {
+            'revision': self.revision,
+            'updated': self.body['info'].get('last_deployed', ''),
+            'status': self.body['info'].get('status', self.status),
+            'chart': '{}-{}'.format(self.chart_name, self.chart_version),
+            'app_version': self.app_version,
+            'description': self.body['info'].get('description', ''),
+        }
+
+
+# index of the latest revision of each release, built from the helm release secrets
+class ReleaseIndex:
+
+    def __init__(self, secrets):
+        self._releases = {}
+        for secret in secrets:
+            release = Release(secret)
+            key = (release.namespace, release.name)
+            if key not in self._releases or self._releases[key].revision < release.revision:
+                self._releases[key] = release
+        self._by_namespace = {}
+        self._by_status = {}
+        for key in sorted(self._releases):
+            release = self._releases[key]
+            self._by_namespace.setdefault(release.namespace, []).append(release)
+            self._by_status.setdefault(release.status, []).append(release)
+
+    def __len__(self):
+        return len(self._releases)
+
+    def get(self, namespace_name, release_name):
+        return self._releases.get((namespace_name, release_name))
+
+    def get_by_namespace(self, namespace_name):
+        return list(self._by_namespace.get(namespace_name, []))
+
+    def get_by_status(self, status):
+        return list(self._by_status.get(status, []))
+
+    # decodes the release body of all the releases (with the given statuses) which were not decoded yet
+    def get_by_chart_version(self, chart_version, chart_name=None, statuses=None):
+        return [
+            release for release in self.iterate(statuses=statuses)
+            if release.chart_version == chart_version and (chart_name is None or release.chart_name == chart_name)
+        ]
+
+    # iterates over releases sorted by name and namespace, similar to helm ls --all-namespaces
+    # release_name_filter is a regular expression, same as helm ls --filter
+    def iterate(self, release_name_filter=None, statuses=None):
+        if release_name_filter:
+            release_name_filter = re.compile(release_name_filter)
+        for release in sorted(self._releases.values(), key=lambda r: (r.name, r.namespace)):
+            if statuses is not None and release.status not in statuses:
+                continue
+            if release_name_filter and not release_name_filter.search(release.name):
+                continue
+            yield release
+
+
+def get_release_index(label_selector=None, namespace_lib=None):
+    if not namespace_lib:
+        namespace_lib = namespace
+    if label_selector:
+        label_selector = '{},{}'.format(HELM_RELEASE_SECRETS_LABEL_SELECTOR, label_selector)
+    else:
+        label_selector = HELM_RELEASE_SECRETS_LABEL_SELECTOR
+    return ReleaseIndex(namespace_lib.get_all_secrets(label_selector=label_selector))
+
+
+# returns all the revisions of a release, sorted by revision
+def get_release_revisions(namespace_name, release_name, namespace_lib=None):
+    if not namespace_lib:
+        namespace_lib = namespace
+    secrets = namespace_lib.get_secrets(namespace_name, label_selector='{},name={}'.format(HELM_RELEASE_SECRETS_LABEL_SELECTOR, release_name))
+    return sorted((Release(secret) for secret in secrets), key=lambda release: release.revision)
+
+
+# same as helm list --namespace <namespace_name> --filter ^<release_name>$ -o json
+def get_release_details(namespace_name, release_name, namespace_lib=None):
+    revisions = get_release_revisions(namespace_name, release_name, namespace_lib=namespace_lib)
+    assert revisions and revisions[-1].status in HELM_LS_DEFAULT_STATUSES, 'release not found ({} {})'.format(namespace_name, release_name)
+    return revisions[-1].to_dict()
+
+
+# same as helm history --namespace <namespace_name> <release_name> -o json
+def get_release_history(namespace_name, release_name, max_revisions=256, namespace_lib=None):
+    revisions = get_release_revisions(namespace_name, release_name, namespace_lib=namespace_lib)
+    assert revisions, 'release: not found'
+    return [release.to_history_dict() for release in revisions[-max_revisions:]]
@@ -0,0 +1,60 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from cwm_worker_deployment import config
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _get_retry(retries, retry_backoff_factor):
+    kwargs = dict(
+        total=retries, connect=retries, read=retries, status=retries,
+        backoff_factor=retry_backoff_factor, status_forcelist=(502, 503, 504),
+        raise_on_status=False
+    )
+    # all our requests are idempotent, including the Prometheus query POST requests
+    methods = frozenset(['GET', 'HEAD', 'POST'])
+    try:
+        return Retry(allowed_methods=methods, **kwargs)
+    except TypeError:
+        # urllib3 < 1.26
+        return Retry(method_whitelist=methods, **kwargs)
+
+
+def create_session(pool_connections=None, pool_maxsize=None, retries=None, retry_backoff_factor=None):
+    adapter = HTTPAdapter(
+        pool_connections=config.HTTP_POOL_CONNECTIONS if pool_connections is None else pool_connections,
+        pool_maxsize=config.HTTP_POOL_MAXSIZE if pool_maxsize is None else pool_maxsize,
+        max_retries=_get_retry(
+            config.HTTP_RETRIES if retries is None else retries,
+            config.HTTP_RETRY_BACKOFF_FACTOR if retry_backoff_factor is None else retry_backoff_factor
+        )
+    )
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+# returns the shared session, it is created on first use and keeps connections alive between calls
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+
+# replaces the shared session, set to None to create a new session on next use
+def set_session(session):
+    global _session
+    with _session_lock:
+        if _session is not None and _session is not session:
+            _session.close()
+        _session = session
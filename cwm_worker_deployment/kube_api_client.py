@@ -0,0 +1,107 @@
+import time
+import threading
+
+from kubernetes import client
+
+
+# client side rate limiting, allows burst requests at once and then qps requests per second
+class TokenBucket:
+
+    def __init__(self, qps, burst):
+        self.qps = qps
+        self.burst = max(1, burst)
+        self._tokens = self.burst
+        self._last_time = time.monotonic()
+        self._lock = threading.Lock()
+
+    # waits until a token is available and returns the number of seconds waited
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last_time) * self.qps)
+            self._last_time = now
+            self._tokens -= 1
+            wait_seconds = -self._tokens / self.qps if self._tokens < 0 else 0
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+        return wait_seconds
+
+
+# kubernetes==11.0.0 rest client only supports an int (total timeout) or a (connect, read) tuple
+# and silently ignores other values, so float timeouts are converted to a (connect, read) tuple
+def _get_request_timeout(request_timeout):
+    if isinstance(request_timeout, float):
+        return request_timeout, request_timeout
+    else:
+        return request_timeout
+
+
+def _is_watch_request(url, kwargs):
+    query_params = kwargs.get('query_params') or []
+    return any(k == 'watch' and v for k, v in query_params) or 'watch=true' in url.lower()
+
+
+# ApiClient which applies to all requests:
+#   a default request timeout (unless the request sets _request_timeout or it's a watch request)
+#   client side rate limiting (if qps is set)
+#   a limit of concurrent requests (max_concurrent_requests, default is the connection pool size), so requests wait
+#     for a pooled connection instead of opening new connections which are discarded when the pool is full
+# and keeps metrics of the time spent waiting, see get_metrics
+# watch requests are not limited and not included in the pool wait metrics, a watch holds a pooled connection for as
+# long as it streams events, so the connection pool should be sized for max_concurrent_requests plus the number of
+# concurrent watches (see namespace._create_api_client)
+class ApiClient(client.ApiClient):
+
+    def __init__(self, configuration, request_timeout_seconds=None, qps=None, burst=None, max_concurrent_requests=None):
+        super(ApiClient, self).__init__(configuration)
+        self._request_timeout_seconds = request_timeout_seconds
+        self._rate_limiter = TokenBucket(qps, burst) if qps else None
+        self._pool_semaphore = threading.BoundedSemaphore(max_concurrent_requests or configuration.connection_pool_maxsize)
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            "requests": 0,
+            "watch_requests": 0,
+            "in_flight": 0,
+            "pool_waits": 0,
+            "pool_wait_seconds": 0.0,
+            "pool_wait_max_seconds": 0.0,
+            "rate_limit_wait_seconds": 0.0,
+        }
+        self._rest_client_request = self.rest_client.request
+        self.rest_client.request = self._request
+
+    def _update_metrics(self, **kwargs):
+        with self._metrics_lock:
+            for k, v in kwargs.items():
+                if k == "pool_wait_max_seconds":
+                    self._metrics[k] = max(self._metrics[k], v)
+                else:
+                    self._metrics[k] += v
+
+    def get_metrics(self):
+        with self._metrics_lock:
+            return dict(self._metrics)
+
+    def _request(self, method, url, *args, **kwargs):
+        rate_limit_wait_seconds = self._rate_limiter.acquire() if self._rate_limiter else 0
+        if _is_watch_request(url, kwargs):
+            # watch requests are long-lived and set their own timeouts
+            self._update_metrics(requests=1, watch_requests=1, rate_limit_wait_seconds=rate_limit_wait_seconds)
+            return self._rest_client_request(method, url, *args, **kwargs)
+        if kwargs.get('_request_timeout') is not None:
+            kwargs['_request_timeout'] = _get_request_timeout(kwargs['_request_timeout'])
+        elif self._request_timeout_seconds:
+            kwargs['_request_timeout'] = (self._request_timeout_seconds, self._request_timeout_seconds)
+        start_time = time.monotonic()
+        is_pool_wait = not self._pool_semaphore.acquire(blocking=False)
+        if is_pool_wait:
+            self._pool_semaphore.acquire()
+        pool_wait_seconds = time.monotonic() - start_time
+        self._update_metrics(requests=1, in_flight=1, pool_waits=1 if is_pool_wait else 0,
+                             pool_wait_seconds=pool_wait_seconds, pool_wait_max_seconds=pool_wait_seconds,
+                             rate_limit_wait_seconds=rate_limit_wait_seconds)
+        try:
+            return self._rest_client_request(method, url, *args, **kwargs)
+        finally:
+            self._pool_semaphore.release()
+            self._update_metrics(in_flight=-1)
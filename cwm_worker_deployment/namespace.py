@@ -1,39 +1,116 @@
+import re
 import json
 import time
 import urllib3
-import datetime
+import threading
 import traceback
-import subprocess
-
-import requests
-
-from kubernetes import client, config, utils
-from kubernetes.client.rest import ApiException
+from functools import partial, lru_cache
 
 import cwm_worker_deployment.config
+from cwm_worker_deployment import concurrency
+from cwm_worker_deployment import http_session
+from cwm_worker_deployment import deployment_status_cache
 
 
 # This should match the image in cwm_worker_operator deployments_manager
 ALPINE_IMAGE = "alpine:3.15.0@sha256:21a3deaa0d32a8057914f36584b5288d2e5ecc984380bc0118285c70fa8c9300"
 
+# label added to each sub-query of a batched Prometheus query to split the results back
+PROMETHEUS_BATCH_METRIC_LABEL = "cwm_worker_deployment_metric"
+
+# label of the helm release secret which contains the fingerprint of the deployed release (see helm.get_fingerprint)
+RELEASE_FINGERPRINT_LABEL = "cwm-worker-deployment-fingerprint"
+
+NAMESPACE_NAME_RE = re.compile(r'^[a-z0-9]([-a-z0-9]*[a-z0-9])?$')
+
 
 urllib3.disable_warnings()
-try:
-    config.load_incluster_config()
-except config.ConfigException:
+
+# kubernetes api clients are created on first use, see _get_client
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _load_kube_config():
+    from kubernetes import config
     try:
-        config.load_kube_config()
+        config.load_incluster_config()
     except config.ConfigException:
-        raise Exception("Could not configure kubernetes python client")
+        try:
+            config.load_kube_config()
+        except config.ConfigException:
+            raise Exception("Could not configure kubernetes python client")
+
+
+def _create_api_client():
+    from kubernetes import client
+    from cwm_worker_deployment import kube_api_client
+    _load_kube_config()
+    # get_default_copy was added in kubernetes 12, in older versions Configuration() is a copy of the default configuration
+    configuration = getattr(client.Configuration, 'get_default_copy', client.Configuration)()
+    # watches (deployment status cache, delete data jobs) hold pooled connections while they stream events
+    # so the pool has room for them in addition to KUBE_CONNECTION_POOL_MAXSIZE concurrent requests
+    configuration.connection_pool_maxsize = (cwm_worker_deployment.config.KUBE_CONNECTION_POOL_MAXSIZE
+                                             + cwm_worker_deployment.config.KUBE_WATCH_CONNECTION_POOL_MAXSIZE)
+    return kube_api_client.ApiClient(
+        configuration,
+        max_concurrent_requests=cwm_worker_deployment.config.KUBE_CONNECTION_POOL_MAXSIZE,
+        request_timeout_seconds=cwm_worker_deployment.config.KUBE_REQUEST_TIMEOUT_SECONDS,
+        qps=cwm_worker_deployment.config.KUBE_CLIENT_QPS,
+        burst=cwm_worker_deployment.config.KUBE_CLIENT_BURST
+    )
+
+
+# kube config is loaded and the clients are created only when first used, all apis share a single api client
+# (and its connection pool), it's thread-safe and the clients are created only once per process
+def _get_client(name):
+    from kubernetes import client
+    with _clients_lock:
+        if 'apiClient' not in _clients:
+            _clients['apiClient'] = _create_api_client()
+        if name not in _clients:
+            _clients[name] = {
+                'coreV1Api': client.CoreV1Api,
+                'appsV1Api': client.AppsV1Api,
+                'batchV1Api': client.BatchV1Api,
+            }[name](_clients['apiClient'])
+        return _clients[name]
+
+
+def get_api_client():
+    return _get_client('apiClient')
+
+
+def get_core_v1_api():
+    return _get_client('coreV1Api')
+
+
+def get_apps_v1_api():
+    return _get_client('appsV1Api')
+
+
+def get_batch_v1_api():
+    return _get_client('batchV1Api')
+
+
+# returns metrics of the requests sent by the kubernetes api client (e.g. time spent waiting for a pooled connection)
+def get_api_client_metrics():
+    return get_api_client().get_metrics()
+
+
+# backwards compatibility for the module attributes which were created on import (e.g. namespace.coreV1Api)
+def __getattr__(name):
+    if name in ('coreV1Api', 'appsV1Api', 'apiClient', 'batchV1Api'):
+        return _get_client(name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
 
 
-coreV1Api = client.CoreV1Api()
-appsV1Api = client.AppsV1Api()
-apiClient = client.ApiClient()
-batchV1Api = client.BatchV1Api()
+# when started, is_ready_deployment answers from the cache instead of reading the deployment status
+_deployment_status_cache = None
 
 
 def init(namespace_name, dry_run=False):
+    from kubernetes.client.rest import ApiException
     namespace_spec = {
         "apiVersion": "v1",
         "kind": "Namespace",
@@ -49,33 +126,54 @@ def init(namespace_name, dry_run=False):
         print(namespace_spec)
     else:
         try:
-            coreV1Api.create_namespace(namespace_spec)
+            get_core_v1_api().create_namespace(namespace_spec)
         except ApiException as e:
             if e.reason != "Conflict":
                 raise
 
 
 def delete(namespace_name, dry_run=False):
+    from kubernetes.client.rest import ApiException
     if dry_run:
         print("delete namespace: {}".format(namespace_name))
     else:
         try:
-            coreV1Api.delete_namespace(namespace_name)
+            get_core_v1_api().delete_namespace(namespace_name)
         except ApiException as e:
             if e.reason != "Not Found":
                 raise
 
 
+def start_deployment_status_cache(deployment_names, **kwargs):
+    global _deployment_status_cache
+    stop_deployment_status_cache()
+    _deployment_status_cache = deployment_status_cache.DeploymentStatusCache(deployment_names, get_apps_v1_api().list_deployment_for_all_namespaces, **kwargs)
+    _deployment_status_cache.start()
+    return _deployment_status_cache
+
+
+def stop_deployment_status_cache():
+    global _deployment_status_cache
+    if _deployment_status_cache is not None:
+        _deployment_status_cache.stop()
+        _deployment_status_cache = None
+
+
 def is_ready_deployment(namespace_name, deployment_name):
+    if _deployment_status_cache is not None:
+        res = _deployment_status_cache.is_ready_deployment(namespace_name, deployment_name)
+        if res is not None:
+            return res
     try:
-        return appsV1Api.read_namespaced_deployment_status(deployment_name, namespace_name).status.ready_replicas > 0
+        return get_apps_v1_api().read_namespaced_deployment_status(deployment_name, namespace_name).status.ready_replicas > 0
     except Exception:
         return False
 
 
 def delete_deployment(namespace_name, deployment_name, force_now=False):
+    from kubernetes.client.rest import ApiException
     try:
-        appsV1Api.delete_namespaced_deployment(
+        get_apps_v1_api().delete_namespaced_deployment(
             deployment_name, namespace_name,
             **({'grace_period_seconds': 0} if force_now else {})
         )
@@ -84,7 +182,100 @@ def delete_deployment(namespace_name, deployment_name, force_now=False):
             raise
 
 
-def delete_data(namespace_name, delete_data_config):
+# returns True if the job succeeded, False if it failed or None if it's still running
+def _get_job_result(job):
+    status = job.status
+    if status and status.succeeded and status.succeeded >= 1:
+        return True
+    elif status and status.failed and status.failed >= 1:
+        return False
+    else:
+        return None
+
+
+# waits for the job to complete using a watch on the job, the job status is also read every resync_seconds
+# in case watch events were missed, returns the job result or None if timed out
+# returns False if the job was deleted (e.g. externally) before it completed
+def _wait_job(namespace_name, job_name, timeout_seconds, resync_seconds):
+    from kubernetes import watch
+    from kubernetes.client.rest import ApiException
+    start_time = time.time()
+    while time.time() - start_time < timeout_seconds:
+        try:
+            job = get_batch_v1_api().read_namespaced_job_status(job_name, namespace_name)
+            result = _get_job_result(job)
+            if result is not None:
+                return result
+            remaining_seconds = timeout_seconds - (time.time() - start_time)
+            w = watch.Watch()
+            for event in w.stream(get_batch_v1_api().list_namespaced_job, namespace_name,
+                                  field_selector='metadata.name={}'.format(job_name),
+                                  resource_version=job.metadata.resource_version,
+                                  timeout_seconds=max(1, int(min(resync_seconds, remaining_seconds)))):
+                if event['type'] == 'DELETED':
+                    w.stop()
+                    return False
+                elif event['type'] in ('ADDED', 'MODIFIED'):
+                    result = _get_job_result(event['object'])
+                    if result is not None:
+                        w.stop()
+                        return result
+        except ApiException as e:
+            if e.status == 404:
+                return False
+            traceback.print_exc()
+            time.sleep(1)
+        except Exception:
+            traceback.print_exc()
+            time.sleep(1)
+    return None
+
+
+# handle of a delete data job, returned by delete_data_start
+class DeleteDataHandle:
+
+    def __init__(self, namespace_name, job_name, timeout_seconds):
+        self.namespace_name = namespace_name
+        self.job_name = job_name
+        self.timeout_seconds = timeout_seconds
+        self.start_time = time.time()
+        self.result = None
+
+    def _finish(self, result):
+        self.result = result
+        get_batch_v1_api().delete_namespaced_job(self.job_name, self.namespace_name, propagation_policy='Foreground')
+        return result
+
+    def done(self):
+        return self.result is not None
+
+    # non-blocking, reads the job status once
+    # returns True / False when the job completed or timed out (the job is then deleted) or None if it's still running
+    def poll(self):
+        if self.result is None:
+            result = _get_job_result(get_batch_v1_api().read_namespaced_job_status(self.job_name, self.namespace_name))
+            if result is None and time.time() - self.start_time >= self.timeout_seconds:
+                result = False
+            if result is not None:
+                self._finish(result)
+        return self.result
+
+    # blocks until the job completed or timed out, raises an exception if delete data failed
+    def wait(self, resync_seconds=None):
+        if self.result is None:
+            result = False
+            try:
+                result = bool(_wait_job(
+                    self.namespace_name, self.job_name, self.timeout_seconds - (time.time() - self.start_time),
+                    resync_seconds or cwm_worker_deployment.config.DELETE_DATA_WATCH_RESYNC_SECONDS
+                ))
+            finally:
+                self._finish(result)
+        assert self.result, 'failed to delete data'
+
+
+# creates the delete data job and returns a DeleteDataHandle without waiting for it to complete
+def delete_data_start(namespace_name, delete_data_config, timeout_seconds=None):
     sub_path, volume = delete_data_config['subPath'], delete_data_config['volume']
     sub_path = sub_path.strip()
     assert len(sub_path) > 3
@@ -122,27 +313,15 @@ def delete_data(namespace_name, delete_data_config):
             },
         }
     }])
-    try:
-        success = False
-        start_time = datetime.datetime.now()
-        while (datetime.datetime.now() - start_time).total_seconds() < 1800:
-            time.sleep(1)
-            try:
-                job: client.V1Job = batchV1Api.read_namespaced_job_status(job_name, namespace_name)
-                status: client.V1JobStatus = job.status
-                if status.succeeded and status.succeeded >= 1:
-                    success = True
-                    break
-                elif status.failed and status.failed >= 1:
-                    break
-            except:
-                traceback.print_exc()
-        assert success, 'failed to delete data'
-    finally:
-        batchV1Api.delete_namespaced_job(job_name, namespace_name, propagation_policy='Foreground')
+    return DeleteDataHandle(namespace_name, job_name, timeout_seconds or cwm_worker_deployment.config.DELETE_DATA_TIMEOUT_SECONDS)
+
+
+def delete_data(namespace_name, delete_data_config, timeout_seconds=None):
+    delete_data_start(namespace_name, delete_data_config, timeout_seconds=timeout_seconds).wait()
 
 
 def create_service(namespace_name, service):
+    from kubernetes.client.rest import ApiException
     service_body = {
         "apiVersion": "v1",
         "kind": "Service",
@@ -150,21 +329,116 @@ def create_service(namespace_name, service):
         "spec": service["spec"]
     }
     try:
-        coreV1Api.create_namespaced_service(namespace_name, service_body)
+        get_core_v1_api().create_namespaced_service(namespace_name, service_body)
     except ApiException as e:
         if e.reason != "Conflict":
             raise
 
 
 def create_objects(namespace_name, objects):
+    from kubernetes import utils
     for object in objects:
         try:
-            utils.create_from_dict(apiClient, object, namespace=namespace_name)
+            utils.create_from_dict(get_api_client(), object, namespace=namespace_name)
         except utils.FailToCreateError as e:
             if any([a.reason != "AlreadyExists" and a.reason != "Conflict" for a in e.api_exceptions]):
                 raise
 
 
+# plural resource name and whether it's namespaced of the kinds which can be applied with apply_objects
+APPLY_OBJECTS_KINDS = {
+    'ConfigMap': ('configmaps', True),
+    'CronJob': ('cronjobs', True),
+    'DaemonSet': ('daemonsets', True),
+    'Deployment': ('deployments', True),
+    'Ingress': ('ingresses', True),
+    'Job': ('jobs', True),
+    'PersistentVolume': ('persistentvolumes', False),
+    'PersistentVolumeClaim': ('persistentvolumeclaims', True),
+    'Role': ('roles', True),
+    'RoleBinding': ('rolebindings', True),
+    'Secret': ('secrets', True),
+    'Service': ('services', True),
+    'ServiceAccount': ('serviceaccounts', True),
+    'StatefulSet': ('statefulsets', True),
+    'StorageClass': ('storageclasses', False),
+}
+
+# field manager name used for server-side apply
+APPLY_OBJECTS_FIELD_MANAGER = 'cwm-worker-deployment'
+
+
+def _get_apply_object_path(namespace_name, object):
+    plural, is_namespaced = APPLY_OBJECTS_KINDS[object['kind']]
+    api_version = object['apiVersion']
+    path = '/api/{}'.format(api_version) if '/' not in api_version else '/apis/{}'.format(api_version)
+    if is_namespaced:
+        path += '/namespaces/{}'.format(namespace_name)
+    return '{}/{}/{}'.format(path, plural, object['metadata']['name'])
+
+
+# returns the json data of a request to the kubernetes api, or None if the object was not found
+# the request is sent with call_api so it has the api client default headers, cookie and auth settings
+def _request_apply_object(api_client, method, path, query_params=None, content_type=None, body=None):
+    from kubernetes.client.rest import ApiException
+    header_params = {'Accept': 'application/json'}
+    if content_type:
+        header_params['Content-Type'] = content_type
+    kwargs = dict(query_params=query_params or [], header_params=header_params, body=body, auth_settings=['BearerToken'])
+    try:
+        if hasattr(api_client, 'param_serialize'):
+            # newer kubernetes clients serialize the request separately and return the response without reading it
+            res = api_client.call_api(*api_client.param_serialize(method, path, **kwargs))
+        else:
+            res = api_client.call_api(path, method, _preload_content=False, _return_http_data_only=True, **kwargs)
+        data = res.read()
+    except ApiException as e:
+        if e.status == 404:
+            return None
+        raise
+    if res.status == 404:
+        return None
+    elif not 200 <= res.status <= 299:
+        raise ApiException(http_resp=res)
+    return json.loads(data)
+
+
+# the object is fetched before it's applied, the apply result is determined by comparing the resourceVersion
+# which kubernetes changes only when the object is modified, so a no-op apply keeps the same resourceVersion
+# if the object is modified by another client between the get and the apply it's also reported as updated
+def _apply_object(namespace_name, object):
+    object = {**object, 'metadata': {**object['metadata']}}
+    assert object['kind'] in APPLY_OBJECTS_KINDS, 'unsupported kind for apply: {}'.format(object['kind'])
+    if APPLY_OBJECTS_KINDS[object['kind']][1]:
+        object['metadata']['namespace'] = namespace_name
+    api_client = get_api_client()
+    path = _get_apply_object_path(namespace_name, object)
+    existing_object = _request_apply_object(api_client, 'GET', path)
+    # JSON is valid YAML, the body is sent as a string so the rest client doesn't try to serialize it
+    applied_object = _request_apply_object(api_client, 'PATCH', path,
+                                           query_params=[('fieldManager', APPLY_OBJECTS_FIELD_MANAGER), ('force', 'true')],
+                                           content_type='application/apply-patch+yaml', body=json.dumps(object))
+    if existing_object is None:
+        result = 'created'
+    elif existing_object['metadata'].get('resourceVersion') == applied_object['metadata'].get('resourceVersion'):
+        result = 'unchanged'
+    else:
+        result = 'updated'
+    return {
+        'kind': object['kind'],
+        'name': object['metadata']['name'],
+        'result': result,
+    }
+
+
+# creates or updates the objects using server-side apply, the objects are applied concurrently with up to max_workers
+# returns a list of {"kind", "name", "result"} in the same order as the objects, result is created / updated / unchanged
+def apply_objects(namespace_name, objects, max_workers=None):
+    if not max_workers:
+        max_workers = cwm_worker_deployment.config.APPLY_OBJECTS_MAX_WORKERS
+    return concurrency.run_all([partial(_apply_object, namespace_name, object) for object in objects], max_workers)
+
+
 def metrics_check_prometheus_rate_query(namespace_name, query, debug=False):
     query = query.replace("__NAMESPACE_NAME__", namespace_name)
     url = cwm_worker_deployment.config.PROMETHEUS_URL.strip("/") + "/api/v1/query"
@@ -172,7 +446,7 @@ def metrics_check_prometheus_rate_query(namespace_name, query, debug=False):
     if debug:
         print(url)
         print(params)
-    res = requests.get(url, params=params, timeout=15).json()
+    res = http_session.get_session().get(url, params=params, timeout=15).json()
     if debug:
         print(res)
     value = 0.0
@@ -182,38 +456,211 @@ def metrics_check_prometheus_rate_query(namespace_name, query, debug=False):
     return value
 
 
-def get_kube_metrics(namespace_name):
-    metrics = {
+def _get_prometheus_batch_query(queries, sum_by=None):
+    return ' or '.join(
+        'label_replace(sum{by}({query}), "{label}", "{name}", "", "")'.format(
+            by=' by ({})'.format(sum_by) if sum_by else '', query=query, label=PROMETHEUS_BATCH_METRIC_LABEL, name=name
+        )
+        for name, query in queries.items()
+    )
+
+
+def _get_prometheus_bulk_query(queries, namespace_names):
+    for namespace_name in namespace_names:
+        assert NAMESPACE_NAME_RE.match(namespace_name), 'invalid namespace name: {}'.format(namespace_name)
+    namespace_matcher = 'namespace=~"{}"'.format('|'.join(namespace_names))
+    bulk_queries = {}
+    for name, query in queries.items():
+        assert 'namespace="__NAMESPACE_NAME__"' in query, 'query does not support bulk namespaces: {}'.format(query)
+        bulk_queries[name] = query.replace('namespace="__NAMESPACE_NAME__"', namespace_matcher)
+    return _get_prometheus_batch_query(bulk_queries, sum_by='namespace')
+
+
+def _prometheus_query(query, debug=False):
+    url = cwm_worker_deployment.config.PROMETHEUS_URL.strip("/") + "/api/v1/query"
+    data = {"query": query}
+    if debug:
+        print(url)
+        print(data)
+    res = http_session.get_session().post(url, data=data, timeout=15).json()
+    if debug:
+        print(res)
+    if res['status'] == 'success' and res['data']['resultType'] == 'vector':
+        return res['data']['result']
+    else:
+        return []
+
+
+# runs multiple queries in a single Prometheus request, queries is a dict of name -> query
+# returns a dict of name -> value, each value is the sum of the query result vector, same as metrics_check_prometheus_rate_query
+def metrics_check_prometheus_rate_queries(namespace_name, queries, debug=False):
+    queries = {name: query.replace("__NAMESPACE_NAME__", namespace_name) for name, query in queries.items()}
+    values = {name: 0.0 for name in queries}
+    if not queries:
+        return values
+    for metric in _prometheus_query(_get_prometheus_batch_query(queries), debug=debug):
+        name = metric['metric'].get(PROMETHEUS_BATCH_METRIC_LABEL)
+        if name in values:
+            values[name] += float(metric['value'][1])
+    return values
+
+
+# runs the queries for many namespaces at once, using a namespace regex matcher and summing by namespace
+# namespaces are split into chunks of config.PROMETHEUS_BULK_MAX_NAMESPACES_PER_QUERY to limit the query size
+# returns a dict of namespace_name -> name -> value
+def metrics_check_prometheus_rate_queries_bulk(namespace_names, queries, debug=False):
+    namespace_names = list(dict.fromkeys(namespace_names))
+    values = {namespace_name: {name: 0.0 for name in queries} for namespace_name in namespace_names}
+    if not queries:
+        return values
+    chunk_size = cwm_worker_deployment.config.PROMETHEUS_BULK_MAX_NAMESPACES_PER_QUERY
+    for i in range(0, len(namespace_names), chunk_size):
+        query = _get_prometheus_bulk_query(queries, namespace_names[i:i + chunk_size])
+        for metric in _prometheus_query(query, debug=debug):
+            namespace_values = values.get(metric['metric'].get('namespace'))
+            name = metric['metric'].get(PROMETHEUS_BATCH_METRIC_LABEL)
+            if namespace_values is not None and name in namespace_values:
+                namespace_values[name] += float(metric['value'][1])
+    return values
+
+
+# quantities are parsed with decimal precision which is slow, and the same few quantity strings are used by all deployments
+@lru_cache(maxsize=1024)
+def _parse_quantity_bytes(quantity):
+    from kubernetes import utils
+    return int(utils.quantity.parse_quantity(quantity))
+
+
+def _get_empty_kube_metrics():
+    return {
         'ram_requests_bytes': 0,
         'ram_limit_bytes': 0
     }
-    for deployment in appsV1Api.list_namespaced_deployment(namespace_name).items:
-        available_replicas = deployment.status.available_replicas
-        if available_replicas:
-            for container in deployment.spec.template.spec.containers:
-                if container.resources:
-                    if container.resources.limits and container.resources.limits.get('memory'):
-                        metrics['ram_limit_bytes'] += (available_replicas * int(utils.quantity.parse_quantity(container.resources.limits['memory'])))
-                    if container.resources.requests and container.resources.requests.get('memory'):
-                        metrics['ram_requests_bytes'] += (available_replicas * int(utils.quantity.parse_quantity(container.resources.requests['memory'])))
+
+
+# adds the memory requests / limits of the deployment available replicas to the metrics
+# deployment is a raw json dict (see _list_items)
+def _add_deployment_kube_metrics(metrics, deployment):
+    available_replicas = (deployment.get('status') or {}).get('availableReplicas')
+    if available_replicas:
+        for container in deployment['spec']['template']['spec']['containers']:
+            resources = container.get('resources') or {}
+            limits = resources.get('limits') or {}
+            requests = resources.get('requests') or {}
+            if limits.get('memory'):
+                metrics['ram_limit_bytes'] += (available_replicas * _parse_quantity_bytes(limits['memory']))
+            if requests.get('memory'):
+                metrics['ram_requests_bytes'] += (available_replicas * _parse_quantity_bytes(requests['memory']))
+
+
+def get_kube_metrics(namespace_name):
+    metrics = _get_empty_kube_metrics()
+    for deployment in get_deployments(namespace_name):
+        _add_deployment_kube_metrics(metrics, deployment)
     return metrics
 
 
-def get_deployments(namespace_name):
-    return json.loads(
-        subprocess.check_output(['kubectl', '-n', namespace_name, 'get', 'deployments', '-o', 'json'])
-    ).get('items', [])
+# same as get_kube_metrics for many namespaces using a single list of deployments in all namespaces
+# returns a dict of namespace_name -> metrics, if namespace_names is None returns all namespaces which have deployments
+def get_kube_metrics_bulk(namespace_names=None, label_selector=None):
+    if namespace_names is None:
+        namespaces_metrics = {}
+    else:
+        namespaces_metrics = {namespace_name: _get_empty_kube_metrics() for namespace_name in namespace_names}
+    for deployment in get_all_deployments(label_selector=label_selector):
+        namespace_name = deployment['metadata']['namespace']
+        if namespace_names is None:
+            namespaces_metrics.setdefault(namespace_name, _get_empty_kube_metrics())
+        elif namespace_name not in namespaces_metrics:
+            continue
+        _add_deployment_kube_metrics(namespaces_metrics[namespace_name], deployment)
+    return namespaces_metrics
+
+
+# returns the list items as raw json dicts (same as kubectl -o json), without deserializing to client models
+def _list_items(list_func, *args, label_selector=None, field_selector=None):
+    kwargs = {}
+    if label_selector:
+        kwargs['label_selector'] = label_selector
+    if field_selector:
+        kwargs['field_selector'] = field_selector
+    return json.loads(list_func(*args, _preload_content=False, **kwargs).data).get('items', [])
+
+
+def get_deployments(namespace_name, label_selector=None, field_selector=None):
+    return _list_items(get_apps_v1_api().list_namespaced_deployment, namespace_name,
+                       label_selector=label_selector, field_selector=field_selector)
+
+
+def get_pods(namespace_name, label_selector=None, field_selector=None):
+    return _list_items(get_core_v1_api().list_namespaced_pod, namespace_name,
+                       label_selector=label_selector, field_selector=field_selector)
+
+
+def get_all_deployments(label_selector=None, field_selector=None):
+    return _list_items(get_apps_v1_api().list_deployment_for_all_namespaces,
+                       label_selector=label_selector, field_selector=field_selector)
+
+
+def get_all_pods(label_selector=None, field_selector=None):
+    return _list_items(get_core_v1_api().list_pod_for_all_namespaces,
+                       label_selector=label_selector, field_selector=field_selector)
+
+
+def get_secrets(namespace_name, label_selector=None, field_selector=None):
+    return _list_items(get_core_v1_api().list_namespaced_secret, namespace_name,
+                       label_selector=label_selector, field_selector=field_selector)
+
+
+def get_all_secrets(label_selector=None, field_selector=None):
+    return _list_items(get_core_v1_api().list_secret_for_all_namespaces,
+                       label_selector=label_selector, field_selector=field_selector)
+
+
+def get_namespaces(label_selector=None, field_selector=None):
+    return _list_items(get_core_v1_api().list_namespace, label_selector=label_selector, field_selector=field_selector)
+
+
+# returns the helm release secret of the latest deployed revision, or None if there is no deployed revision
+# returns the secret of the latest revision of the release, which may also be failed or pending
+def _get_latest_release_secret(namespace_name, release_name):
+    items = get_secrets(namespace_name, label_selector='owner=helm,name={}'.format(release_name))
+    return max(items, key=lambda item: int(item['metadata']['labels'].get('version', '0')), default=None)
+
+
+# the fingerprint is returned only if the latest revision is deployed
+# after a failed or pending upgrade the previous revision is still marked as deployed
+# but the release resources may have been partly changed, so the fingerprint doesn't apply
+def get_release_fingerprint(namespace_name, release_name):
+    secret = _get_latest_release_secret(namespace_name, release_name)
+    if secret and secret['metadata']['labels'].get('status') == 'deployed':
+        return secret['metadata']['labels'].get(RELEASE_FINGERPRINT_LABEL)
+    else:
+        return None
+
+
+def set_release_fingerprint(namespace_name, release_name, fingerprint):
+    secret = _get_latest_release_secret(namespace_name, release_name)
+    assert secret and secret['metadata']['labels'].get('status') == 'deployed', 'deployed release not found ({} {})'.format(namespace_name, release_name)
+    get_core_v1_api().patch_namespaced_secret(secret['metadata']['name'], namespace_name, {
+        'metadata': {'labels': {RELEASE_FINGERPRINT_LABEL: fingerprint}}
+    })
 
 
-def get_pods(namespace_name):
-    return json.loads(
-        subprocess.check_output(['kubectl', '-n', namespace_name, 'get', 'pods', '-o', 'json'])
-    ).get('items', [])
+# removes the fingerprint label, so that the next deploy upgrades the release even if the fingerprint didn't change
+# should be called when the release resources are changed or deleted without helm
+def clear_release_fingerprint(namespace_name, release_name):
+    secret = _get_latest_release_secret(namespace_name, release_name)
+    if secret and RELEASE_FINGERPRINT_LABEL in (secret['metadata'].get('labels') or {}):
+        get_core_v1_api().patch_namespaced_secret(secret['metadata']['name'], namespace_name, {
+            'metadata': {'labels': {RELEASE_FINGERPRINT_LABEL: None}}
+        })
 
 
 def get_namespace(namespace_name):
+    from kubernetes.client.rest import ApiException
     try:
-        return coreV1Api.read_namespace(namespace_name).to_dict()
+        return get_core_v1_api().read_namespace(namespace_name).to_dict()
     except ApiException as e:
         if e.reason == 'Not Found':
             return None
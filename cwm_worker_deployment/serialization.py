@@ -0,0 +1,30 @@
+import json
+
+from ruamel import yaml
+
+
+# libyaml based loader / dumper of ruamel.yaml (requires ruamel.yaml.clib)
+# they resolve the same YAML 1.2 types as the pure-Python yaml.safe_load / yaml.safe_dump
+if getattr(yaml, '__with_libyaml__', False):
+    SafeLoader, SafeDumper = yaml.CSafeLoader, yaml.CSafeDumper
+else:
+    SafeLoader, SafeDumper = yaml.SafeLoader, yaml.SafeDumper
+
+
+def yaml_safe_load(stream):
+    return yaml.load(stream, Loader=SafeLoader)
+
+
+def yaml_safe_dump(data, stream=None, **kwargs):
+    return yaml.dump(data, stream, Dumper=SafeDumper, **kwargs)
+
+
+# dumps values to a file which can be used as helm values file
+# JSON is valid YAML and much faster to dump, YAML is used for values which can't be represented in JSON (e.g. dates)
+def dump_values(values, f):
+    try:
+        content = json.dumps(values, allow_nan=False)
+    except (TypeError, ValueError):
+        yaml_safe_dump(values, f)
+    else:
+        f.write(content)
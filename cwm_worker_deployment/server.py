@@ -0,0 +1,112 @@
+import os
+import json
+import socket
+import traceback
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from cwm_worker_deployment import config
+from cwm_worker_deployment import deployment
+
+
+# deployment functions which can be called by the client, requests are POST /<method> with a json object of kwargs
+METHODS = ('deploy', 'delete', 'is_ready', 'details', 'history', 'get_health', 'get_metrics')
+
+
+class UnixThreadingHTTPServer(ThreadingHTTPServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        # the socket is created accessible only by the owner, because the server can deploy and delete deployments
+        umask = os.umask(0o177)
+        try:
+            self.socket.bind(self.server_address)
+        finally:
+            os.umask(umask)
+        self.server_name, self.server_port = self.server_address, 0
+
+    # the http.server request handler expects a (host, port) client address
+    def get_request(self):
+        request, _ = super(UnixThreadingHTTPServer, self).get_request()
+        return request, ('local', 0)
+
+
+def _get_handler_class(deployment_lib):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # buffer the response so that headers and body are sent together
+        wbufsize = -1
+
+        def _send_json(self, status, data):
+            body = json.dumps(data, default=str).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/healthz':
+                self._send_json(200, {'success': True})
+            else:
+                self._send_json(404, {'success': False, 'error': 'not found'})
+
+        def do_POST(self):
+            content_length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(content_length) if content_length else b''
+            method = self.path.strip('/')
+            if method not in METHODS:
+                self._send_json(404, {'success': False, 'error': 'unknown method: {}'.format(method)})
+                return
+            try:
+                kwargs = json.loads(body) if body else {}
+                result = getattr(deployment_lib, method)(**kwargs)
+            except Exception as e:
+                traceback.print_exc()
+                self._send_json(200, {'success': False, 'error': '{}: {}'.format(e.__class__.__name__, e)})
+            else:
+                self._send_json(200, {'success': True, 'result': result})
+
+        def log_message(self, format, *args):
+            if config.CWM_WORKER_DEPLOYMENT_SERVER_DEBUG:
+                super(Handler, self).log_message(format, *args)
+
+    return Handler
+
+
+# by default the server listens on a unix socket (CWM_WORKER_DEPLOYMENT_SERVER_UNIX_SOCKET) which only the owner can access
+# if host or port are set it listens on TCP instead, there is no authentication so it should only bind to localhost
+def create_server(host=None, port=None, unix_socket_path=None, deployment_lib=None):
+    if not deployment_lib:
+        deployment_lib = deployment
+    handler_class = _get_handler_class(deployment_lib)
+    if host is None and port is None:
+        return UnixThreadingHTTPServer(unix_socket_path or config.CWM_WORKER_DEPLOYMENT_SERVER_UNIX_SOCKET, handler_class)
+    else:
+        assert not unix_socket_path, 'either unix_socket_path or host / port can be set'
+        return ThreadingHTTPServer((host if host is not None else config.CWM_WORKER_DEPLOYMENT_SERVER_HOST,
+                                    port if port is not None else config.CWM_WORKER_DEPLOYMENT_SERVER_PORT), handler_class)
+
+
+# runs the server until interrupted, the kubernetes clients, helm repo index cache and chart cache are kept warm
+# between requests, with_cache_warmer also keeps the latest chart versions pulled in the background
+def serve(host=None, port=None, unix_socket_path=None, with_cache_warmer=True):
+    server = create_server(host=host, port=port, unix_socket_path=unix_socket_path)
+    is_unix_socket = isinstance(server, UnixThreadingHTTPServer)
+    if is_unix_socket:
+        unix_socket_path = server.server_address
+    if with_cache_warmer:
+        deployment.start_chart_cache_warmer()
+    print('Listening on {}'.format('unix://{}'.format(unix_socket_path) if is_unix_socket else 'http://{}:{}'.format(*server.server_address)), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if with_cache_warmer:
+            deployment.stop_chart_cache_warmer()
+        if is_unix_socket and os.path.exists(unix_socket_path):
+            os.unlink(unix_socket_path)
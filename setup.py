@@ -16,6 +16,7 @@ setup(
     entry_points={
         'console_scripts': [
             'cwm_worker_deployment = cwm_worker_deployment.cli:main',
+            'cwm_worker_deployment_client = cwm_worker_deployment.client:main',
         ]
     },
 )
@@ -0,0 +1,47 @@
+# Benchmark of aggregating the kube metrics of many namespaces, with and without memoized quantity parsing
+# the deployments list is generated locally, so it doesn't measure the kubernetes api calls
+# usage: python -m tests.benchmark_kube_metrics [NUM_NAMESPACES]
+import sys
+import time
+
+from kubernetes import utils
+
+from cwm_worker_deployment import namespace
+
+
+def _get_deployments(num_namespaces):
+    return [
+        {
+            'metadata': {'namespace': 'cwm-worker-{}'.format(i), 'name': name},
+            'spec': {'template': {'spec': {'containers': [
+                {'resources': {'limits': {'memory': '512Mi'}, 'requests': {'memory': '256Mi'}}},
+                {'resources': {'limits': {'memory': '1Gi'}, 'requests': {'memory': '100M'}}},
+            ]}}},
+            'status': {'availableReplicas': 1},
+        } for i in range(num_namespaces) for name in ('minio-server', 'minio-nginx', 'minio-logger')
+    ]
+
+
+def main(num_namespaces=5000):
+    deployments = _get_deployments(int(num_namespaces))
+    namespace.get_all_deployments = lambda label_selector=None: deployments
+    namespace._parse_quantity_bytes.cache_clear()
+    start_time = time.time()
+    namespace.get_kube_metrics_bulk()
+    memoized_seconds = time.time() - start_time
+    parse_quantity_bytes = namespace._parse_quantity_bytes
+    namespace._parse_quantity_bytes = lambda quantity: int(utils.quantity.parse_quantity(quantity))
+    try:
+        start_time = time.time()
+        namespace.get_kube_metrics_bulk()
+        seconds = time.time() - start_time
+    finally:
+        namespace._parse_quantity_bytes = parse_quantity_bytes
+    print('{} deployments'.format(len(deployments)))
+    print('without memoization: {:.3f} seconds'.format(seconds))
+    print('with memoization: {:.3f} seconds'.format(memoized_seconds))
+    print('speedup: x{:.1f}'.format(seconds / memoized_seconds))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,54 @@
+# Benchmark of the Prometheus metrics collection against a local stand-in Prometheus server
+# usage: python -m tests.benchmark_metrics [NUM_NAMESPACES] [LATENCY_MS] [SAMPLE_NAMESPACES]
+# the per-namespace methods are measured on a sample of the namespaces and extrapolated to the full number
+import sys
+import time
+
+from cwm_worker_deployment import config
+from cwm_worker_deployment import deployment
+from cwm_worker_deployment import namespace
+
+from .mocks.prometheus import MockPrometheusServer
+
+
+def _get_metrics_per_query(namespace_name, deployment_type):
+    return {
+        metrics_check['name']: namespace.metrics_check_prometheus_rate_query(namespace_name, metrics_check['query'])
+        for metrics_check in config.DEPLOYMENT_TYPES[deployment_type]['metrics_checks']
+    }
+
+
+def _benchmark(title, prometheus, num_namespaces, sample_namespace_names, func):
+    start_requests = prometheus.num_requests
+    start_time = time.time()
+    func(sample_namespace_names)
+    seconds = (time.time() - start_time) * num_namespaces / len(sample_namespace_names)
+    num_requests = (prometheus.num_requests - start_requests) * num_namespaces // len(sample_namespace_names)
+    print('{}: {:.2f} seconds, {} requests'.format(title, seconds, num_requests))
+    return seconds
+
+
+def main(num_namespaces=5000, latency_ms=1, sample_namespaces=200):
+    num_namespaces, latency_ms, sample_namespaces = int(num_namespaces), float(latency_ms), int(sample_namespaces)
+    namespace_names = ['cwm-worker-{}'.format(i) for i in range(num_namespaces)]
+    sample_namespace_names = namespace_names[:sample_namespaces]
+    print('{} namespaces, {}ms latency per Prometheus request'.format(num_namespaces, latency_ms))
+    with MockPrometheusServer(latency_seconds=latency_ms / 1000) as prometheus:
+        config.PROMETHEUS_URL = prometheus.url
+        per_query_seconds = _benchmark(
+            'query per metric per namespace', prometheus, num_namespaces, sample_namespace_names,
+            lambda namespace_names: [_get_metrics_per_query(namespace_name, 'minio') for namespace_name in namespace_names]
+        )
+        _benchmark(
+            'get_metrics (batched query per namespace)', prometheus, num_namespaces, sample_namespace_names,
+            lambda namespace_names: [deployment.get_metrics(namespace_name, 'minio') for namespace_name in namespace_names]
+        )
+        bulk_seconds = _benchmark(
+            'get_metrics_bulk', prometheus, num_namespaces, namespace_names,
+            lambda namespace_names: deployment.get_metrics_bulk(namespace_names, 'minio')
+        )
+        print('get_metrics_bulk speedup: x{:.1f}'.format(per_query_seconds / bulk_seconds))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
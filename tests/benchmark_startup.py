@@ -0,0 +1,37 @@
+# Benchmark of the startup time of code paths which don't talk to the cluster and of the first kubernetes client use
+# each measurement runs in a new Python process, so imports are not cached
+# usage: python -m tests.benchmark_startup [ITERATIONS]
+import sys
+import time
+import subprocess
+
+
+def _benchmark(title, code, iterations):
+    start_time = time.time()
+    for _ in range(iterations):
+        subprocess.check_call([sys.executable, '-c', code])
+    seconds = (time.time() - start_time) / iterations
+    print('{}: {:.3f} seconds'.format(title, seconds))
+    return seconds
+
+
+def main(iterations=5):
+    iterations = int(iterations)
+    python_seconds = _benchmark('python startup', 'pass', iterations)
+    import_seconds = _benchmark('import deployment', 'from cwm_worker_deployment import deployment', iterations)
+    _benchmark(
+        'get_hostname',
+        'from cwm_worker_deployment import deployment; deployment.get_hostname("example007--com", "minio", "http")',
+        iterations
+    )
+    print('import overhead (without python startup): {:.3f} seconds'.format(import_seconds - python_seconds))
+    # loads the kube config, the cluster doesn't have to be reachable
+    _benchmark(
+        'import deployment and create kubernetes clients',
+        'from cwm_worker_deployment import namespace; namespace.get_core_v1_api(); namespace.get_apps_v1_api()',
+        iterations
+    )
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,69 @@
+# Benchmark of the serialization backends on a large spec and a large helm repo index
+# usage: python -m tests.benchmark_yaml [NUM_SPEC_KEYS] [NUM_INDEX_VERSIONS]
+import io
+import sys
+import time
+import datetime
+
+from ruamel import yaml
+
+from cwm_worker_deployment import serialization
+
+
+def _benchmark(title, func, iterations=3):
+    start_time = time.time()
+    for _ in range(iterations):
+        func()
+    seconds = (time.time() - start_time) / iterations
+    print('{}: {:.3f} seconds'.format(title, seconds))
+    return seconds
+
+
+def _get_spec(num_keys):
+    return {
+        'cwm-worker-deployment': {'type': 'minio', 'namespace': 'cwm-worker-benchmark'},
+        'minio': {
+            'extraEnv': {'ENV_{}'.format(i): {'value': 'value-{}'.format(i), 'enabled': i % 2 == 0} for i in range(num_keys)},
+            'extraObjects': [{'kind': 'ConfigMap', 'name': 'cm-{}'.format(i), 'data': ['a', 'b', i]} for i in range(num_keys)],
+        }
+    }
+
+
+def _get_index(num_versions):
+    start_datetime = datetime.datetime(2020, 1, 1)
+    return {
+        'apiVersion': 'v1',
+        'entries': {
+            'cwm-worker-deployment-minio': [
+                {
+                    'name': 'cwm-worker-deployment-minio',
+                    'version': '0.0.0-{}'.format((start_datetime + datetime.timedelta(hours=i)).strftime('%Y%m%dT%H%M%S')),
+                    'appVersion': '1.0.0',
+                    'created': (start_datetime + datetime.timedelta(hours=i)).isoformat() + 'Z',
+                    'digest': '{:064x}'.format(i),
+                    'urls': ['cwm-worker-deployment-minio-{}.tgz'.format(i)],
+                } for i in range(num_versions)
+            ]
+        }
+    }
+
+
+def _compare(title, pure_func, backend_func):
+    pure_seconds = _benchmark('{} (pure-Python ruamel)'.format(title), pure_func)
+    backend_seconds = _benchmark('{} (serialization backend)'.format(title), backend_func)
+    print('{} speedup: x{:.1f}'.format(title, pure_seconds / backend_seconds))
+
+
+def main(num_spec_keys=5000, num_index_versions=10000):
+    print('libyaml available: {}'.format(serialization.SafeLoader is not yaml.SafeLoader))
+    spec = _get_spec(int(num_spec_keys))
+    spec_content = yaml.safe_dump(spec)
+    index_content = yaml.safe_dump(_get_index(int(num_index_versions)))
+    print('spec: {} bytes, index: {} bytes'.format(len(spec_content), len(index_content)))
+    _compare('load spec', lambda: yaml.safe_load(spec_content), lambda: serialization.yaml_safe_load(spec_content))
+    _compare('load index', lambda: yaml.safe_load(index_content), lambda: serialization.yaml_safe_load(index_content))
+    _compare('dump values', lambda: yaml.safe_dump(spec, io.StringIO()), lambda: serialization.dump_values(spec, io.StringIO()))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -6,6 +6,7 @@ class MockHelm:
     def __init__(self):
         self._upgrade_calls = []
         self._upgrade_call_returnvalue = (0, "OK", "")
+        self._upgrade_call_returnvalues = {}
         self._delete_calls = []
         self._release_details_returnvalues = {}
         self._release_history_returnvalues = {}
@@ -14,13 +15,17 @@ class MockHelm:
     def get_latest_version(self, *args, **kwargs):
         return helm.get_latest_version(*args, **kwargs)
 
+    # this method has no external dependencies
+    def get_fingerprint(self, *args, **kwargs):
+        return helm.get_fingerprint(*args, **kwargs)
+
     # this method is easy to run with minimal external dependencies, not worth the effort to mock
     def chart_cache_init(self, *args, **kwargs):
         return helm.chart_cache_init(*args, **kwargs)
 
     def upgrade(self, *args, **kwargs):
         self._upgrade_calls.append((args, kwargs))
-        return self._upgrade_call_returnvalue
+        return self._upgrade_call_returnvalues.get(args[0], self._upgrade_call_returnvalue)
 
     def delete(self, namespace_name, release_name, **kwargs):
         self._delete_calls.append({"namespace_name": namespace_name, "release_name": release_name, "kwargs": kwargs})
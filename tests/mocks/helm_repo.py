@@ -0,0 +1,34 @@
+import hashlib
+
+from ruamel import yaml
+
+from .http_server import MockHTTPServer
+
+
+# a stand-in for a helm repo serving index.yaml with ETag revalidation
+class MockHelmRepoServer(MockHTTPServer):
+
+    def __init__(self, entries=None):
+        super().__init__()
+        self.statuses = []
+        self.fail = False
+        self.set_entries(entries or {})
+
+    def set_entries(self, entries):
+        self.index_content = yaml.safe_dump({'apiVersion': 'v1', 'entries': entries}).encode()
+        self.etag = '"{}"'.format(hashlib.sha256(self.index_content).hexdigest())
+
+    def _handle_request(self, path, headers):
+        if self.fail:
+            return 503, {}, b'error'
+        elif path != '/index.yaml':
+            return 404, {}, b'not found'
+        elif headers.get('If-None-Match') == self.etag:
+            return 304, {'ETag': self.etag}, b''
+        else:
+            return 200, {'ETag': self.etag}, self.index_content
+
+    def handle_request(self, method, path, headers, body):
+        status, headers, body = self._handle_request(path, headers)
+        self.statuses.append(status)
+        return status, headers, body
@@ -0,0 +1,71 @@
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+# base class for local stand-in HTTP servers, subclasses implement handle_request
+class MockHTTPServer:
+
+    def __init__(self):
+        self.num_requests = 0
+        self.num_connections = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'http://{}:{}'.format(*self._server.server_address)
+
+    # should return a tuple of (status, headers, body)
+    def handle_request(self, method, path, headers, body):
+        raise NotImplementedError()
+
+    def _get_handler_class(self):
+        mock_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # buffer the response so that headers and body are sent together
+            wbufsize = -1
+
+            def setup(self):
+                super().setup()
+                with mock_server._lock:
+                    mock_server.num_connections += 1
+
+            def _handle(self, method):
+                with mock_server._lock:
+                    mock_server.num_requests += 1
+                content_length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(content_length) if content_length else b''
+                status, headers, body = mock_server.handle_request(method, self.path, self.headers, body)
+                self.send_response(status)
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self._handle('GET')
+
+            def do_POST(self):
+                self._handle('POST')
+
+            def do_PATCH(self):
+                self._handle('PATCH')
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._get_handler_class())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._server.shutdown()
+        self._server.server_close()
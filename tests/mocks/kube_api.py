@@ -0,0 +1,60 @@
+import json
+import time
+
+from .http_server import MockHTTPServer
+
+
+# a minimal stand-in for the Kubernetes API server, returns an empty list for any GET request
+# each request takes latency_seconds to respond
+class MockKubeApiServer(MockHTTPServer):
+
+    def __init__(self, latency_seconds=0.0):
+        super().__init__()
+        self.latency_seconds = latency_seconds
+        self.paths = []
+
+    def handle_request(self, method, path, headers, body):
+        with self._lock:
+            self.paths.append(path)
+        time.sleep(self.latency_seconds)
+        return 200, {'Content-Type': 'application/json'}, json.dumps({
+            'kind': 'List', 'apiVersion': 'v1', 'metadata': {}, 'items': []
+        }).encode()
+
+
+# a minimal stand-in for get and server-side apply (PATCH with application/apply-patch+yaml) of the Kubernetes API server
+# objects are stored by path, the resourceVersion changes only when the applied object changes
+class MockKubeApplyServer(MockHTTPServer):
+
+    def __init__(self):
+        super().__init__()
+        self.objects = {}
+        self.requests = []
+        self.authorizations = set()
+        self.default_headers = set()
+        self._resource_version = 0
+
+    def _get_object_response(self, status, path):
+        object, resource_version = self.objects[path]
+        return status, {'Content-Type': 'application/json'}, json.dumps({**object, 'metadata': {
+            **object['metadata'], 'resourceVersion': str(resource_version)
+        }}).encode()
+
+    def handle_request(self, method, path, headers, body):
+        path, _, query = path.partition('?')
+        with self._lock:
+            self.requests.append((method, path, query, headers.get('Content-Type')))
+            self.authorizations.add(headers.get('authorization'))
+            self.default_headers.add(headers.get('x-default-header'))
+            if path.endswith('/forbidden'):
+                return 403, {'Content-Type': 'application/json'}, b'{"kind": "Status", "reason": "Forbidden"}'
+            if method == 'GET':
+                if path not in self.objects:
+                    return 404, {'Content-Type': 'application/json'}, b'{"kind": "Status", "reason": "NotFound"}'
+                return self._get_object_response(200, path)
+            object = json.loads(body)
+            status = 200 if path in self.objects else 201
+            if path not in self.objects or self.objects[path][0] != object:
+                self._resource_version += 1
+                self.objects[path] = (object, self._resource_version)
+            return self._get_object_response(status, path)
@@ -4,14 +4,19 @@ class MockNamespace:
         self._init_namespace_names = []
         self._create_service_calls = []
         self._create_objects_calls = []
+        self._apply_objects_calls = []
         self._deleted_namespace_names = []
         self._deleted_deployments = []
         self._is_ready_deployment_returnvalues = {}
         self._metrics_check_prometheus_rate_query_returnvalues = {}
+        self._metrics_check_prometheus_rate_queries_calls = []
         self._deleted_data = []
         self._get_namespaces = {}
         self._get_pods = {}
         self._get_deployments = {}
+        self._deployment_status_cache_deployment_names = None
+        self._release_fingerprints = {}
+        self._get_all_secrets = []
 
     def init(self, namespace_name, dry_run=False):
         if not dry_run:
@@ -23,6 +28,10 @@ class MockNamespace:
     def create_objects(self, namespace_name, objects):
         self._create_objects_calls.append({"namespace_name": namespace_name, "objects": objects})
 
+    def apply_objects(self, namespace_name, objects, max_workers=None):
+        self._apply_objects_calls.append({"namespace_name": namespace_name, "objects": objects})
+        return [{"kind": object["kind"], "name": object["metadata"]["name"], "result": "created"} for object in objects]
+
     def delete(self, namespace_name, dry_run=False):
         if not dry_run:
             self._deleted_namespace_names.append(namespace_name)
@@ -36,14 +45,66 @@ class MockNamespace:
     def metrics_check_prometheus_rate_query(self, namespace_name, query):
         return self._metrics_check_prometheus_rate_query_returnvalues['{}-{}'.format(namespace_name, query)]
 
+    def metrics_check_prometheus_rate_queries(self, namespace_name, queries):
+        self._metrics_check_prometheus_rate_queries_calls.append((namespace_name, queries))
+        return {name: self.metrics_check_prometheus_rate_query(namespace_name, query) for name, query in queries.items()}
+
+    def metrics_check_prometheus_rate_queries_bulk(self, namespace_names, queries):
+        self._metrics_check_prometheus_rate_queries_calls.append((namespace_names, queries))
+        return {
+            namespace_name: {name: self.metrics_check_prometheus_rate_query(namespace_name, query) for name, query in queries.items()}
+            for namespace_name in namespace_names
+        }
+
     def delete_data(self, namespace_name, delete_data_config):
         self._deleted_data.append((namespace_name, delete_data_config))
 
     def get_namespace(self, namespace_name):
         return self._get_namespaces[namespace_name]
 
-    def get_pods(self, namespace_name):
+    def get_pods(self, namespace_name, label_selector=None, field_selector=None):
         return self._get_pods[namespace_name]
 
-    def get_deployments(self, namespace_name):
-        return self._get_deployments[namespace_name]
\ No newline at end of file
+    def get_deployments(self, namespace_name, label_selector=None, field_selector=None):
+        return self._get_deployments[namespace_name]
+
+    def get_namespaces(self, label_selector=None, field_selector=None):
+        return [namespace_obj for namespace_obj in self._get_namespaces.values() if namespace_obj]
+
+    def get_all_pods(self, label_selector=None, field_selector=None):
+        return [
+            {**pod, 'metadata': {**pod['metadata'], 'namespace': namespace_name}}
+            for namespace_name, pods in self._get_pods.items() for pod in pods
+        ]
+
+    def get_all_deployments(self, label_selector=None, field_selector=None):
+        return [
+            {**deployment, 'metadata': {**deployment['metadata'], 'namespace': namespace_name}}
+            for namespace_name, deployments in self._get_deployments.items() for deployment in deployments
+        ]
+
+    def start_deployment_status_cache(self, deployment_names, **kwargs):
+        self._deployment_status_cache_deployment_names = deployment_names
+
+    def stop_deployment_status_cache(self):
+        self._deployment_status_cache_deployment_names = None
+
+    def get_release_fingerprint(self, namespace_name, release_name):
+        return self._release_fingerprints.get('{}-{}'.format(namespace_name, release_name))
+
+    def set_release_fingerprint(self, namespace_name, release_name, fingerprint):
+        self._release_fingerprints['{}-{}'.format(namespace_name, release_name)] = fingerprint
+
+    def clear_release_fingerprint(self, namespace_name, release_name):
+        self._release_fingerprints.pop('{}-{}'.format(namespace_name, release_name), None)
+
+    def get_all_secrets(self, label_selector=None, field_selector=None):
+        return self._get_all_secrets
+
+    def get_secrets(self, namespace_name, label_selector=None, field_selector=None):
+        labels = dict(label.split('=') for label in label_selector.split(',')) if label_selector else {}
+        return [
+            secret for secret in self._get_all_secrets
+            if secret['metadata']['namespace'] == namespace_name
+            and all(secret['metadata']['labels'].get(k) == v for k, v in labels.items())
+        ]
@@ -0,0 +1,47 @@
+import re
+import json
+import time
+from urllib.parse import urlparse, parse_qs
+
+from cwm_worker_deployment import namespace
+
+from .http_server import MockHTTPServer
+
+
+# a minimal stand-in for the Prometheus /api/v1/query endpoint
+# it understands the queries generated by the namespace module and returns a value for each namespace / metric
+# the value of each namespace and metric is returned by value_func(namespace_name, metric_name)
+class MockPrometheusServer(MockHTTPServer):
+
+    def __init__(self, value_func=None, latency_seconds=0.0):
+        super().__init__()
+        self.value_func = value_func or (lambda namespace_name, metric_name: float(len(namespace_name) + len(metric_name or '')))
+        self.latency_seconds = latency_seconds
+
+    def _get_result(self, query):
+        result = []
+        for sub_query in query.split(' or '):
+            metric_name = re.search(r'"{}", "([^"]+)"'.format(namespace.PROMETHEUS_BATCH_METRIC_LABEL), sub_query)
+            metric_name = metric_name.group(1) if metric_name else None
+            namespace_names = re.search(r'namespace=~?"([^"]*)"', sub_query).group(1).split('|')
+            for namespace_name in namespace_names:
+                labels = {'namespace': namespace_name}
+                if metric_name:
+                    labels[namespace.PROMETHEUS_BATCH_METRIC_LABEL] = metric_name
+                result.append({
+                    'metric': labels,
+                    'value': [time.time(), str(self.value_func(namespace_name, metric_name))]
+                })
+        return result
+
+    def handle_request(self, method, path, headers, body):
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        params = parse_qs(body.decode()) if method == 'POST' else parse_qs(urlparse(path).query)
+        return 200, {'Content-Type': 'application/json'}, json.dumps({
+            'status': 'success',
+            'data': {
+                'resultType': 'vector',
+                'result': self._get_result(params['query'][0])
+            }
+        }).encode()
@@ -0,0 +1,119 @@
+import os
+import time
+import tempfile
+import threading
+
+import pytest
+
+from cwm_worker_deployment import config
+from cwm_worker_deployment import chart_cache
+
+
+class MockPull:
+
+    def __init__(self):
+        self.calls = []
+        self.fail = False
+
+    def __call__(self, chart_name, version, chart_repo, untardir):
+        self.calls.append((chart_name, version, chart_repo))
+        os.makedirs(os.path.join(untardir, chart_name, 'templates'))
+        with open(os.path.join(untardir, chart_name, 'Chart.yaml'), 'w') as f:
+            f.write('name: {}\nversion: {}\n'.format(chart_name, version))
+        time.sleep(0.1)
+        if self.fail:
+            raise Exception('pull failed')
+
+
+@pytest.fixture()
+def cache_dir():
+    cache_dir = config.CWM_WORKER_DEPLOYMENT_HELM_CACHE_DIR
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config.CWM_WORKER_DEPLOYMENT_HELM_CACHE_DIR = tmpdir
+        try:
+            yield tmpdir
+        finally:
+            config.CWM_WORKER_DEPLOYMENT_HELM_CACHE_DIR = cache_dir
+            chart_cache._verified_paths.clear()
+
+
+def test_init_concurrent(cache_dir, monkeypatch):
+    pull = MockPull()
+    monkeypatch.setattr(chart_cache, '_pull', pull)
+    chart_paths = []
+    threads = [
+        threading.Thread(target=lambda: chart_paths.append(chart_cache.init('chart', '0.0.1', 'http://repo')))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert chart_paths == [os.path.join(cache_dir, 'chart', '0.0.1', 'chart')] * 5
+    assert pull.calls == [('chart', '0.0.1', 'http://repo')]
+    assert os.path.exists(os.path.join(chart_paths[0], 'Chart.yaml'))
+    assert not [name for name in os.listdir(os.path.join(cache_dir, 'chart')) if name.startswith('.tmp-')]
+
+
+def test_init_failed_pull(cache_dir, monkeypatch):
+    pull = MockPull()
+    pull.fail = True
+    monkeypatch.setattr(chart_cache, '_pull', pull)
+    with pytest.raises(Exception, match='pull failed'):
+        chart_cache.init('chart', '0.0.1', 'http://repo')
+    assert os.listdir(os.path.join(cache_dir, 'chart')) == ['.0.0.1.lock']
+    pull.fail = False
+    chart_cache.init('chart', '0.0.1', 'http://repo')
+    assert len(pull.calls) == 2
+
+
+def test_init_corrupted(cache_dir, monkeypatch):
+    pull = MockPull()
+    monkeypatch.setattr(chart_cache, '_pull', pull)
+    chart_path = chart_cache.init('chart', '0.0.1', 'http://repo')
+    with open(os.path.join(chart_path, 'Chart.yaml'), 'w') as f:
+        f.write('corrupted')
+    # verified once per process
+    chart_cache.init('chart', '0.0.1', 'http://repo')
+    assert len(pull.calls) == 1
+    chart_cache._verified_paths.clear()
+    assert chart_cache.init('chart', '0.0.1', 'http://repo') == chart_path
+    assert len(pull.calls) == 2
+    with open(os.path.join(chart_path, 'Chart.yaml')) as f:
+        assert f.read() == 'name: chart\nversion: 0.0.1\n'
+
+
+def _set_last_access(chart_name, version, last_access):
+    os.utime(os.path.join(config.CWM_WORKER_DEPLOYMENT_HELM_CACHE_DIR, chart_name, '.{}.lock'.format(version)),
+             (last_access, last_access))
+
+
+def test_gc(cache_dir, monkeypatch):
+    monkeypatch.setattr(chart_cache, '_pull', MockPull())
+    os.makedirs(os.path.join(cache_dir, '_repo_index'))
+    versions = ['0.0.0-20210101T000000', '0.0.0-20210102T000000', '0.0.0-20210103T000000', '0.0.0-20210104T000000']
+    for version in versions:
+        chart_cache.init('chart', version, 'http://repo')
+    # each version has 107 bytes (Chart.yaml + digest file)
+    # the latest version was used least recently, but it's never evicted
+    for i, last_access in enumerate([400, 300, 200, 100]):
+        _set_last_access('chart', versions[i], last_access)
+    os.makedirs(os.path.join(cache_dir, 'chart', '.tmp-{}-abc'.format(versions[0])))
+    assert chart_cache.gc(max_versions_per_chart=2, max_bytes=0, dry_run=True) == [('chart', versions[2], 107)]
+    assert os.path.exists(chart_cache.get_chart_cache_path('chart', versions[2]))
+    with chart_cache.use('chart', versions[2], 'http://repo') as chart_path:
+        assert os.path.exists(os.path.join(chart_path, 'Chart.yaml'))
+        _set_last_access('chart', versions[2], 200)
+        # in use versions are not evicted
+        assert chart_cache.gc(max_versions_per_chart=2, max_bytes=0) == []
+    assert sorted(os.listdir(os.path.join(cache_dir, 'chart'))) == sorted(
+        ['.{}.lock'.format(version) for version in versions] + versions
+    )
+    assert chart_cache.gc(max_versions_per_chart=2, max_bytes=0) == [('chart', versions[2], 107)]
+    assert chart_cache.gc(max_versions_per_chart=0, max_bytes=250) == [('chart', versions[1], 107)]
+    assert sorted(name for name in os.listdir(os.path.join(cache_dir, 'chart')) if not name.endswith('.lock')) == [versions[0], versions[3]]
+    assert os.listdir(os.path.join(cache_dir, '_repo_index')) == []
+    assert chart_cache.gc(max_versions_per_chart=1, max_bytes=1, keep_versions={'chart': [versions[0]]}) == []
+    # evicted versions are pulled again on next use
+    chart_cache.init('chart', versions[2], 'http://repo')
+    assert len(chart_cache._pull.calls) == 5
@@ -1,6 +1,9 @@
 import os
+import sys
 import shutil
 import tempfile
+import threading
+import subprocess
 from glob import glob
 
 import pytest
@@ -85,6 +88,81 @@ def test_deploy():
         deployment.deploy(spec, namespace_lib=namespace, helm_lib=helm)
 
 
+def test_deploy_many():
+    namespace = MockNamespace()
+    helm = MockHelm()
+    helm._upgrade_call_returnvalues['minio-test2'] = (1, "ERROR", "error")
+    specs = {
+        i: {
+            'cwm-worker-deployment': {
+                'type': 'minio',
+                'namespace': 'test{}'.format(i),
+                'chart-path': '/charts/cwm-worker-deployment-minio'
+            }
+        } for i in range(5)
+    }
+    specs[3]['cwm-worker-deployment']['type'] = '__INVALID__'
+    results = deployment.deploy_many(specs, max_workers=3, namespace_lib=namespace, helm_lib=helm)
+    assert list(results.keys()) == [0, 1, 2, 3, 4]
+    assert {key: result['success'] for key, result in results.items()} == {0: True, 1: True, 2: False, 3: False, 4: True}
+    assert results[0]['output'] == 'OK'
+    assert results[2]['error'].startswith('Exception: Helm upgrade failed (returncode=1)')
+    assert results[3]['error'] == 'AssertionError: unknown deployment type: __INVALID__'
+    assert sorted(args[0] for args, kwargs in helm._upgrade_calls) == ['minio-test0', 'minio-test1', 'minio-test2', 'minio-test4']
+    assert sorted(namespace._init_namespace_names) == ['test0', 'test1', 'test2', 'test4']
+
+
+def test_deploy_fingerprint():
+    namespace = MockNamespace()
+    helm = MockHelm()
+    spec = {
+        'cwm-worker-deployment': {
+            'type': 'minio',
+            'namespace': 'test',
+            'chart-path': '/charts/cwm-worker-deployment-minio'
+        },
+        'minio': {'foo': 'bar'}
+    }
+    assert deployment.deploy(spec, namespace_lib=namespace, helm_lib=helm) == "OK"
+    fingerprint = namespace._release_fingerprints['test-minio-test']
+    assert len(fingerprint) == 63
+    assert deployment.deploy(spec, namespace_lib=namespace, helm_lib=helm).startswith('Release "minio-test" is up to date')
+    assert len(helm._upgrade_calls) == 1
+    assert deployment.deploy(spec, namespace_lib=namespace, helm_lib=helm, force=True) == "OK"
+    assert len(helm._upgrade_calls) == 2
+    spec['minio']['foo'] = 'baz'
+    assert deployment.deploy(spec, namespace_lib=namespace, helm_lib=helm) == "OK"
+    assert len(helm._upgrade_calls) == 3
+    assert namespace._release_fingerprints['test-minio-test'] != fingerprint
+    # failed upgrade doesn't change the fingerprint
+    fingerprint = namespace._release_fingerprints['test-minio-test']
+    spec['minio']['foo'] = 'bar'
+    helm._upgrade_call_returnvalue = (1, "ERROR", "error")
+    with pytest.raises(Exception):
+        deployment.deploy(spec, namespace_lib=namespace, helm_lib=helm)
+    assert namespace._release_fingerprints['test-minio-test'] == fingerprint
+
+
+def test_deploy_fingerprint_after_delete_without_helm():
+    namespace = MockNamespace()
+    helm = MockHelm()
+    spec = {
+        'cwm-worker-deployment': {
+            'type': 'minio',
+            'namespace': 'test',
+            'chart-path': '/charts/cwm-worker-deployment-minio'
+        }
+    }
+    assert deployment.deploy(spec, namespace_lib=namespace, helm_lib=helm) == "OK"
+    deployment.delete('test', 'minio', delete_helm=False, namespace_lib=namespace, helm_lib=helm)
+    assert 'test-minio-test' not in namespace._release_fingerprints
+    assert helm._delete_calls == []
+    # the deployments were deleted but the release was kept, so the deploy must not be skipped
+    assert deployment.deploy(spec, namespace_lib=namespace, helm_lib=helm) == "OK"
+    assert len(helm._upgrade_calls) == 2
+    assert 'test-minio-test' in namespace._release_fingerprints
+
+
 def test_deploy_external_service():
     namespace = MockNamespace()
     spec = {
@@ -150,6 +228,35 @@ def test_deploy_extra_objects():
     }]
 
 
+def test_deploy_server_side_apply():
+    namespace = MockNamespace()
+    spec = {
+        'cwm-worker-deployment': {
+            'type': 'minio',
+            'namespace': 'test'
+        }
+    }
+    assert deployment.deploy_external_service(spec, namespace_lib=namespace, server_side_apply=True) == [
+        {'kind': 'Service', 'name': 'minio-server', 'result': 'created'},
+        {'kind': 'Service', 'name': 'minio-nginx', 'result': 'created'},
+    ]
+    assert namespace._create_service_calls == []
+    assert namespace._apply_objects_calls[0]['objects'][1] == {
+        'apiVersion': 'v1',
+        'kind': 'Service',
+        'metadata': {'name': 'minio-nginx'},
+        'spec': {'ports': [{'name': '80', 'port': 80}, {'name': '443', 'port': 443}], 'selector': {'app': 'minio-nginx'}}
+    }
+    assert deployment.deploy_extra_objects(spec, [
+        {'apiVersion': 'v1', 'kind': 'PersistentVolume', 'name': 'test-pv', 'spec': 'capacity:\n  storage: 1Gi'},
+        {'apiVersion': 'v1', 'kind': 'PersistentVolumeClaim', 'name': 'test-pvc', 'spec': 'volumeName: test-pv'},
+    ], namespace_lib=namespace, server_side_apply=True) == [
+        {'kind': 'PersistentVolume', 'name': 'test-pv', 'result': 'created'},
+        {'kind': 'PersistentVolumeClaim', 'name': 'test-pvc', 'result': 'created'},
+    ]
+    assert namespace._create_objects_calls == []
+
+
 def test_delete():
     namespace = MockNamespace()
     helm = MockHelm()
@@ -174,15 +281,58 @@ def test_delete():
     assert namespace._deleted_data == []
 
 
+def test_delete_many():
+    namespace_b_deleted = threading.Event()
+
+    class SlowDeleteDataMockNamespace(MockNamespace):
+
+        def delete_data(self, namespace_name, delete_data_config):
+            # waits for namespace b to be deleted, to make sure this slow delete data doesn't hold up other deletions
+            assert namespace_b_deleted.wait(5)
+            super().delete_data(namespace_name, delete_data_config)
+
+        def delete(self, namespace_name, dry_run=False):
+            super().delete(namespace_name, dry_run=dry_run)
+            if namespace_name == 'b':
+                namespace_b_deleted.set()
+
+    class FailingMockHelm(MockHelm):
+
+        def delete(self, namespace_name, release_name, **kwargs):
+            if namespace_name == 'c':
+                raise Exception('release delete failed')
+            super().delete(namespace_name, release_name, **kwargs)
+
+    namespace = SlowDeleteDataMockNamespace()
+    helm = FailingMockHelm()
+    results = deployment.delete_many({
+        'a': {'namespace_name': 'a', 'deployment_type': 'minio', 'delete_data': True, 'delete_data_config': {'foo': 'bar'}, 'delete_namespace': True},
+        'b': {'namespace_name': 'b', 'deployment_type': 'minio', 'delete_namespace': True},
+        'c': {'namespace_name': 'c', 'deployment_type': 'minio', 'delete_namespace': True},
+        'd': {'namespace_name': 'd', 'deployment_type': 'minio'},
+    }, max_workers=1, namespace_lib=namespace, helm_lib=helm)
+    assert results == {
+        'a': {'success': True},
+        'b': {'success': True},
+        'c': {'success': False, 'error': 'Exception: release delete failed'},
+        'd': {'success': True},
+    }
+    assert [call['release_name'] for call in helm._delete_calls] == ['minio-a', 'minio-b', 'minio-d']
+    assert namespace._deleted_namespace_names == ['b', 'a']
+    assert namespace._deleted_data == [('a', {'foo': 'bar'})]
+
+
 def test_is_ready():
     namespace = MockNamespace()
     namespace._is_ready_deployment_returnvalues['test-minio-server'] = True
     namespace._is_ready_deployment_returnvalues['test-minio-logger'] = True
     namespace._is_ready_deployment_returnvalues['test-minio-nginx'] = True
     assert deployment.is_ready('test', 'minio', namespace_lib=namespace)
+    assert deployment.is_ready('test', 'minio', namespace_lib=namespace, max_workers=3)
     namespace = MockNamespace()
     namespace._is_ready_deployment_returnvalues['test-minio'] = False
     assert not deployment.is_ready('test', 'minio', namespace_lib=namespace)
+    assert not deployment.is_ready('test', 'minio', namespace_lib=namespace, max_workers=3)
 
 
 def test_details():
@@ -208,6 +358,10 @@ def test_details():
     namespace._is_ready_deployment_returnvalues['test-minio-logger'] = True
     expected_deployment_details['ready'] = True
     assert deployment.details('test', 'minio', helm_lib=helm, namespace_lib=namespace) == expected_deployment_details
+    assert deployment.details('test', 'minio', helm_lib=helm, namespace_lib=namespace, max_workers=4) == expected_deployment_details
+    namespace._is_ready_deployment_returnvalues['test-minio-logger'] = False
+    expected_deployment_details['ready'] = False
+    assert deployment.details('test', 'minio', helm_lib=helm, namespace_lib=namespace, max_workers=4) == expected_deployment_details
 
 
 def test_history():
@@ -221,10 +375,26 @@ def test_get_hostname():
     assert deployment.get_hostname('test', 'minio', 'https') == 'minio-nginx.test.svc.cluster.local'
 
 
+def test_start_stop_readiness_cache():
+    namespace = MockNamespace()
+    deployment.start_readiness_cache(namespace_lib=namespace)
+    assert namespace._deployment_status_cache_deployment_names == {'minio-logger', 'minio-server', 'minio-nginx'}
+    deployment.stop_readiness_cache(namespace_lib=namespace)
+    assert namespace._deployment_status_cache_deployment_names is None
+
+
 def test_get_metrics():
     namespace = MockNamespace()
     _set_namespace_metrics(namespace)
     assert deployment.get_metrics('test', 'minio', namespace_lib=namespace) == EXPECTED_NAMESPACE_METRICS
+    assert len(namespace._metrics_check_prometheus_rate_queries_calls) == 1
+
+
+def test_get_metrics_bulk():
+    namespace = MockNamespace()
+    _set_namespace_metrics(namespace)
+    assert deployment.get_metrics_bulk(['test'], 'minio', namespace_lib=namespace) == {'test': EXPECTED_NAMESPACE_METRICS}
+    assert len(namespace._metrics_check_prometheus_rate_queries_calls) == 1
 
 
 def test_delete_data():
@@ -323,6 +493,7 @@ def test_get_health():
         }
     })
     res = deployment.get_health('cwm-worker-123456', 'minio', namespace_lib=namespace)
+    assert res == deployment.get_health('cwm-worker-123456', 'minio', namespace_lib=namespace, max_workers=4)
     assert res == {
         'is_ready': False,
         'namespace': {'name': namespace_name, 'phase': 'Active'},
@@ -371,6 +542,43 @@ def test_get_health():
     }
 
 
+def test_get_health_bulk():
+    namespace = MockNamespace()
+    for namespace_name in ['cwm-worker-1', 'cwm-worker-2']:
+        namespace._get_namespaces[namespace_name] = {
+            'metadata': {'name': namespace_name},
+            'status': {'phase': 'Active'}
+        }
+        namespace._get_pods[namespace_name] = [{
+            'metadata': {'name': 'minio-server-1', 'labels': {'app': 'minio-server'}},
+            'status': {'phase': 'Running', 'conditions': [{'type': 'Ready', 'status': 'True'}]},
+            'spec': {'nodeName': 'worker1'}
+        }]
+        namespace._get_deployments[namespace_name] = [
+            {
+                'metadata': {'name': deployment_name},
+                'spec': {'selector': {'matchLabels': {'app': deployment_name}}},
+                'status': {'replicas': 1, 'readyReplicas': 1}
+            }
+            for deployment_name in ['minio-server', 'minio-logger', 'minio-nginx']
+        ]
+        namespace._is_ready_deployment_returnvalues.update({
+            '{}-{}'.format(namespace_name, deployment_name): True
+            for deployment_name in ['minio-server', 'minio-logger', 'minio-nginx']
+        })
+    namespace._get_deployments['cwm-worker-2'][0]['status']['readyReplicas'] = 0
+    namespace._is_ready_deployment_returnvalues['cwm-worker-2-minio-server'] = False
+    namespace._get_namespaces['cwm-worker-3'] = None
+    res = deployment.get_health_bulk(['cwm-worker-1', 'cwm-worker-2', 'cwm-worker-3'], 'minio', namespace_lib=namespace)
+    assert res == {
+        'cwm-worker-1': deployment.get_health('cwm-worker-1', 'minio', namespace_lib=namespace),
+        'cwm-worker-2': deployment.get_health('cwm-worker-2', 'minio', namespace_lib=namespace),
+        'cwm-worker-3': None
+    }
+    assert res['cwm-worker-1']['is_ready']
+    assert not res['cwm-worker-2']['is_ready']
+
+
 def test_get_health_no_namespace():
     namespace = MockNamespace()
     namespace_name = 'cwm-worker-123456'
@@ -383,3 +591,56 @@ def test_get_namespace_name_from_hostname():
     for protocol in ['http', 'https']:
         hostname = deployment.get_hostname(namespace_name, 'minio', protocol)
         assert namespace_name == deployment.get_namespace_name_from_hostname('minio', protocol, hostname)
+
+
+def test_get_health_label_selector():
+    assert deployment.get_health_label_selector('minio') == 'app in (minio-external-scaler,minio-logger,minio-nginx,minio-server)'
+
+
+class MockWarmHelm(MockHelm):
+
+    def __init__(self):
+        super(MockWarmHelm, self).__init__()
+        self._chart_cache_init_calls = []
+        self._chart_cache_init_event = threading.Event()
+
+    def get_latest_version(self, repo_url, chart_name):
+        if chart_name != 'cwm-worker-deployment-minio':
+            raise Exception('failed to find latest version ({} {})'.format(repo_url, chart_name))
+        return '0.0.0-20210101T000000'
+
+    def chart_cache_init(self, chart_name, version, chart_repo):
+        self._chart_cache_init_calls.append((chart_name, version, chart_repo))
+        self._chart_cache_init_event.set()
+        return '/charts/{}/{}/{}'.format(chart_name, version, chart_name)
+
+
+def test_chart_cache_warm():
+    helm = MockWarmHelm()
+    assert deployment.chart_cache_warm(deployment_types=['minio', 'invalid'], helm_lib=helm) == {
+        'minio': {'success': True, 'version': '0.0.0-20210101T000000'},
+        'invalid': {'success': False, 'error': 'Exception: failed to find latest version (https://raw.githubusercontent.com/CloudWebManage/cwm-worker-helm/master/cwm-worker-deployment-invalid cwm-worker-deployment-invalid)'},
+    }
+    assert helm._chart_cache_init_calls == [(
+        'cwm-worker-deployment-minio', '0.0.0-20210101T000000',
+        'https://raw.githubusercontent.com/CloudWebManage/cwm-worker-helm/master/cwm-worker-deployment-minio'
+    )]
+    helm = MockWarmHelm()
+    deployment.start_chart_cache_warmer(interval_seconds=60, helm_lib=helm)
+    try:
+        assert helm._chart_cache_init_event.wait(5)
+    finally:
+        deployment.stop_chart_cache_warmer()
+    assert deployment._chart_cache_warmer is None
+    assert len(helm._chart_cache_init_calls) == 1
+
+
+def test_import_without_kubernetes():
+    # get_hostname and deploy --dry-run don't use the kubernetes client, so it's only imported when first used
+    subprocess.check_call([sys.executable, '-c', '\n'.join([
+        'import sys',
+        'from cwm_worker_deployment import deployment, helm, helm_releases, namespace',
+        'assert "kubernetes" not in sys.modules, "kubernetes was imported"',
+        'deployment.get_hostname("example007--com", "minio", "http")',
+        'assert "kubernetes" not in sys.modules, "kubernetes was imported"',
+    ])])
@@ -0,0 +1,73 @@
+import threading
+from types import SimpleNamespace
+
+from cwm_worker_deployment.deployment_status_cache import DeploymentStatusCache
+
+
+def _deployment(namespace_name, ready_replicas, resource_version):
+    return SimpleNamespace(
+        metadata=SimpleNamespace(namespace=namespace_name, name='minio-server', resource_version=resource_version),
+        status=SimpleNamespace(ready_replicas=ready_replicas)
+    )
+
+
+class MockList:
+
+    def __init__(self, results):
+        self.results = results
+        self.calls = []
+
+    def __call__(self, **kwargs):
+        self.calls.append(kwargs)
+        items, resource_version = self.results.pop(0)
+        return SimpleNamespace(items=items, metadata=SimpleNamespace(resource_version=resource_version))
+
+
+class MockWatch:
+    streams = []
+    calls = []
+    idle = threading.Event()
+
+    def __init__(self):
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def stream(self, func, **kwargs):
+        MockWatch.calls.append(kwargs)
+        if MockWatch.streams:
+            yield from MockWatch.streams.pop(0)
+        else:
+            MockWatch.idle.set()
+            self._stop_event.wait()
+
+
+def test_deployment_status_cache():
+    list_func = MockList([
+        ([_deployment('ns1', 1, '1')], '1'),
+        ([_deployment('ns1', 0, '4')], '5'),
+    ])
+    MockWatch.streams = [
+        [
+            {'type': 'ADDED', 'object': _deployment('ns2', 1, '2')},
+            {'type': 'ERROR', 'raw_object': {'code': 410}},
+        ],
+        [
+            {'type': 'MODIFIED', 'object': _deployment('ns2', 2, '6')},
+        ]
+    ]
+    cache = DeploymentStatusCache(['minio-server'], list_func, watch_class=MockWatch)
+    assert cache.is_ready_deployment('ns1', 'minio-server') is None
+    cache.start()
+    try:
+        assert cache.wait_synced(timeout_seconds=5)
+        assert MockWatch.idle.wait(5)
+        assert cache.is_ready_deployment('ns1', 'minio-server') is False
+        assert cache.is_ready_deployment('ns2', 'minio-server') is True
+        assert cache.is_ready_deployment('ns3', 'minio-server') is False
+        assert cache.is_ready_deployment('ns1', 'minio-logger') is None
+        assert list_func.calls == [{'field_selector': 'metadata.name=minio-server'}] * 2
+        assert [call['resource_version'] for call in MockWatch.calls] == ['1', '5', '6']
+    finally:
+        cache.stop()
@@ -7,10 +7,13 @@ import subprocess
 from glob import glob
 
 import pytest
+import requests
 
 from cwm_worker_deployment import helm
 from cwm_worker_deployment import config
+from cwm_worker_deployment import http_session
 
+from .mocks.helm_repo import MockHelmRepoServer
 from .common import wait_for_func, init_wait_deploy_helm
 
 
@@ -25,6 +28,70 @@ def test_get_latest_version():
     assert isinstance(datetime.datetime.strptime(datetimestring, "%Y%m%dT%H%M%S"), datetime.datetime)
 
 
+def _get_index_entries(chart_name, versions):
+    return {chart_name: [{'name': chart_name, 'version': version} for version in versions]}
+
+
+def test_get_latest_version_index_cache():
+    chart_name = 'cwm-worker-deployment-minio'
+    cache_dir, ttl_seconds = config.CWM_WORKER_DEPLOYMENT_HELM_CACHE_DIR, config.HELM_REPO_INDEX_CACHE_TTL_SECONDS
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with MockHelmRepoServer(_get_index_entries(chart_name, ['0.0.0-20210101T000000', '0.0.0-20210102T000000'])) as repo:
+            try:
+                config.CWM_WORKER_DEPLOYMENT_HELM_CACHE_DIR = tmpdir
+                config.HELM_REPO_INDEX_CACHE_TTL_SECONDS = 3600
+                http_session.set_session(http_session.create_session(retries=3, retry_backoff_factor=0))
+                assert helm.get_latest_version(repo.url, chart_name) == '0.0.0-20210102T000000'
+                assert helm.get_latest_version(repo.url, chart_name) == '0.0.0-20210102T000000'
+                assert repo.statuses == [200]
+                # expired cache is revalidated
+                config.HELM_REPO_INDEX_CACHE_TTL_SECONDS = 0
+                assert helm.get_latest_version(repo.url, chart_name) == '0.0.0-20210102T000000'
+                assert repo.statuses == [200, 304]
+                repo.set_entries(_get_index_entries(chart_name, ['0.0.0-20210102T000000', '0.0.0-20210103T000000']))
+                assert helm.get_latest_version(repo.url, chart_name) == '0.0.0-20210103T000000'
+                assert repo.statuses == [200, 304, 200]
+                # stale cached index is used when the repo fails, the revalidation request is not retried
+                metadata_path = os.path.join(helm._get_repo_index_cache_path(repo.url), 'metadata.json')
+                with open(metadata_path) as f:
+                    metadata = json.load(f)
+                with open(metadata_path, 'w') as f:
+                    json.dump({**metadata, 'fetched_at': 0}, f)
+                config.HELM_REPO_INDEX_CACHE_TTL_SECONDS = 3600
+                repo.fail = True
+                assert helm.get_latest_version(repo.url, chart_name) == '0.0.0-20210103T000000'
+                assert repo.statuses == [200, 304, 200, 503]
+                # and it's used until the next TTL without revalidating it again
+                assert helm.get_latest_version(repo.url, chart_name) == '0.0.0-20210103T000000'
+                assert repo.statuses == [200, 304, 200, 503]
+                config.HELM_REPO_INDEX_CACHE_TTL_SECONDS = 0
+                with pytest.raises(requests.RequestException):
+                    helm.get_latest_version(repo.url + '/invalid', chart_name)
+                assert helm.get_latest_version(repo.url, chart_name, before=datetime.datetime(2021, 1, 3)) == '0.0.0-20210102T000000'
+                with pytest.raises(AssertionError):
+                    helm.get_latest_version(repo.url, chart_name, before=datetime.datetime(2021, 1, 2))
+            finally:
+                config.CWM_WORKER_DEPLOYMENT_HELM_CACHE_DIR = cache_dir
+                config.HELM_REPO_INDEX_CACHE_TTL_SECONDS = ttl_seconds
+                http_session.set_session(None)
+
+
+def test_get_fingerprint(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        monkeypatch.setattr(config, 'CWM_WORKER_DEPLOYMENT_HELM_CACHE_DIR', os.path.join(tmpdir, 'cache1'))
+        cache_chart_path = os.path.join(helm.chart_cache.get_chart_cache_path('chart', '0.0.1'), 'chart')
+        fingerprint = helm.get_fingerprint('0.0.1', {'a': 1}, chart_path=cache_chart_path, chart_name='chart')
+        assert fingerprint == helm.get_fingerprint('0.0.1', {'a': 1})
+        # the chart cache dir is not part of the fingerprint
+        monkeypatch.setattr(config, 'CWM_WORKER_DEPLOYMENT_HELM_CACHE_DIR', os.path.join(tmpdir, 'cache2'))
+        cache_chart_path = os.path.join(helm.chart_cache.get_chart_cache_path('chart', '0.0.1'), 'chart')
+        assert helm.get_fingerprint('0.0.1', {'a': 1}, chart_path=cache_chart_path, chart_name='chart') == fingerprint
+        # an explicit chart path is part of the fingerprint
+        assert helm.get_fingerprint('0.0.1', {'a': 1}, chart_path='/charts/chart', chart_name='chart') != fingerprint
+        assert helm.get_fingerprint('0.0.2', {'a': 1}) != fingerprint
+        assert helm.get_fingerprint('0.0.1', {'a': 2}) != fingerprint
+
+
 def test_chart_cache_init():
     with tempfile.TemporaryDirectory() as tmpdir:
         config.CWM_WORKER_DEPLOYMENT_HELM_CACHE_DIR = tmpdir
@@ -0,0 +1,99 @@
+import gzip
+import json
+import base64
+
+import pytest
+
+from cwm_worker_deployment import helm_releases
+
+from .mocks.namespace import MockNamespace
+
+
+def _release_secret(namespace_name, release_name, revision, status, chart_version, compress=True):
+    release = {
+        'name': release_name,
+        'namespace': namespace_name,
+        'version': revision,
+        'info': {'status': status, 'last_deployed': '2021-05-05T10:11:12.123450Z'},
+        'chart': {'metadata': {'name': 'cwm-worker-deployment-minio', 'version': chart_version, 'appVersion': '1.0'}},
+    }
+    data = json.dumps(release).encode()
+    if compress:
+        data = gzip.compress(data)
+    return {
+        'metadata': {
+            'namespace': namespace_name,
+            'name': 'sh.helm.release.v1.{}.v{}'.format(release_name, revision),
+            'labels': {'owner': 'helm', 'name': release_name, 'status': status, 'version': str(revision)},
+            'resourceVersion': '1{}'.format(revision),
+        },
+        'data': {'release': base64.b64encode(base64.b64encode(data)).decode()},
+    }
+
+
+def test_decode_release():
+    secret = _release_secret('ns1', 'minio', 1, 'deployed', '0.0.1')
+    assert helm_releases.decode_release(secret['data']['release'])['chart']['metadata']['version'] == '0.0.1'
+    secret = _release_secret('ns1', 'minio', 1, 'deployed', '0.0.1', compress=False)
+    assert helm_releases.decode_release(secret['data']['release'])['name'] == 'minio'
+
+
+def test_format_helm_time():
+    assert helm_releases.format_helm_time('2021-05-05T10:11:12.123450Z') == '2021-05-05 10:11:12.12345 +0000 UTC'
+    assert helm_releases.format_helm_time('2021-05-05T10:11:12+03:00') == '2021-05-05 10:11:12 +0300 +0300'
+
+
+def test_release_index():
+    namespace = MockNamespace()
+    namespace._get_all_secrets = [
+        _release_secret('ns1', 'minio', 1, 'superseded', '0.0.1'),
+        _release_secret('ns1', 'minio', 2, 'deployed', '0.0.2'),
+        _release_secret('ns2', 'minio', 1, 'failed', '0.0.1'),
+        _release_secret('ns3', 'minio', 1, 'pending-install', '0.0.2'),
+        _release_secret('ns1', 'other', 1, 'deployed', '0.0.1'),
+    ]
+    index = helm_releases.get_release_index(namespace_lib=namespace)
+    assert len(index) == 4
+    assert index.get('ns1', 'minio').revision == 2
+    assert index.get('ns1', 'minio')._body is None
+    assert [(r.namespace, r.name) for r in index.get_by_namespace('ns1')] == [('ns1', 'minio'), ('ns1', 'other')]
+    assert [r.namespace for r in index.get_by_status('deployed')] == ['ns1', 'ns1']
+    assert [(r.namespace, r.name) for r in index.get_by_chart_version('0.0.1')] == [('ns2', 'minio'), ('ns1', 'other')]
+    assert [r.namespace for r in index.get_by_chart_version('0.0.2', statuses=['deployed'])] == ['ns1']
+    assert [r.to_dict() for r in index.iterate('^minio$', statuses=helm_releases.HELM_LS_DEFAULT_STATUSES)] == [
+        {'name': 'minio', 'namespace': 'ns1', 'revision': '2', 'updated': '2021-05-05 10:11:12.12345 +0000 UTC',
+         'status': 'deployed', 'chart': 'cwm-worker-deployment-minio-0.0.2', 'app_version': '1.0'},
+        {'name': 'minio', 'namespace': 'ns2', 'revision': '1', 'updated': '2021-05-05 10:11:12.12345 +0000 UTC',
+         'status': 'failed', 'chart': 'cwm-worker-deployment-minio-0.0.1', 'app_version': '1.0'},
+    ]
+
+
+def test_release_details_history(monkeypatch):
+    namespace = MockNamespace()
+    namespace._get_all_secrets = [
+        _release_secret('ns1', 'minio', 2, 'deployed', '0.0.2'),
+        _release_secret('ns1', 'minio', 1, 'superseded', '0.0.1'),
+        _release_secret('ns2', 'minio', 1, 'pending-install', '0.0.1'),
+    ]
+    monkeypatch.setattr(helm_releases, '_release_bodies', helm_releases.OrderedDict())
+    decode_calls = []
+    decode_release = helm_releases.decode_release
+    monkeypatch.setattr(helm_releases, 'decode_release', lambda data: decode_calls.append(data) or decode_release(data))
+    assert helm_releases.get_release_details('ns1', 'minio', namespace_lib=namespace) == {
+        'name': 'minio', 'namespace': 'ns1', 'revision': '2', 'updated': '2021-05-05 10:11:12.12345 +0000 UTC',
+        'status': 'deployed', 'chart': 'cwm-worker-deployment-minio-0.0.2', 'app_version': '1.0'
+    }
+    assert [
+        (item['revision'], item['status'], item['chart'])
+        for item in helm_releases.get_release_history('ns1', 'minio', namespace_lib=namespace)
+    ] == [(1, 'superseded', 'cwm-worker-deployment-minio-0.0.1'), (2, 'deployed', 'cwm-worker-deployment-minio-0.0.2')]
+    assert helm_releases.get_release_history('ns1', 'minio', namespace_lib=namespace)[0] == {
+        'revision': 1, 'updated': '2021-05-05T10:11:12.123450Z', 'status': 'superseded',
+        'chart': 'cwm-worker-deployment-minio-0.0.1', 'app_version': '1.0', 'description': ''
+    }
+    # each secret resourceVersion was decoded only once
+    assert len(decode_calls) == 2
+    with pytest.raises(AssertionError):
+        helm_releases.get_release_details('ns2', 'minio', namespace_lib=namespace)
+    with pytest.raises(AssertionError):
+        helm_releases.get_release_history('ns3', 'minio', namespace_lib=namespace)
@@ -0,0 +1,91 @@
+import time
+import threading
+
+import pytest
+from kubernetes import client
+
+from cwm_worker_deployment import kube_api_client
+
+from .mocks.kube_api import MockKubeApiServer
+
+
+def _get_api(server, connection_pool_maxsize=2, **kwargs):
+    configuration = client.Configuration()
+    configuration.host = server.url
+    configuration.connection_pool_maxsize = connection_pool_maxsize
+    return client.CoreV1Api(kube_api_client.ApiClient(configuration, **kwargs))
+
+
+def test_token_bucket():
+    bucket = kube_api_client.TokenBucket(qps=20, burst=5)
+    start_time = time.monotonic()
+    wait_seconds = [bucket.acquire() for _ in range(10)]
+    assert wait_seconds[:5] == [0] * 5
+    assert all(seconds > 0 for seconds in wait_seconds[5:])
+    assert 0.2 <= time.monotonic() - start_time < 0.5
+
+
+def test_pool_wait_metrics():
+    with MockKubeApiServer(latency_seconds=0.2) as server:
+        api = _get_api(server)
+        threads = [threading.Thread(target=api.list_namespace) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        metrics = api.api_client.get_metrics()
+        assert metrics['requests'] == 4
+        assert metrics['in_flight'] == 0
+        assert metrics['pool_waits'] == 2
+        assert metrics['pool_wait_max_seconds'] >= 0.15
+        assert server.num_connections == 2
+
+
+def test_pool_wait_metrics_watch():
+    with MockKubeApiServer(latency_seconds=0.2) as server:
+        # the pool has room for a watch in addition to the concurrent requests
+        api = _get_api(server, connection_pool_maxsize=3, max_concurrent_requests=2)
+        threads = [threading.Thread(target=api.list_namespace) for _ in range(4)]
+        threads.append(threading.Thread(target=api.list_namespace, kwargs={'watch': True, '_preload_content': False}))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        metrics = api.api_client.get_metrics()
+        assert metrics['requests'] == 5
+        assert metrics['watch_requests'] == 1
+        # the watch doesn't wait for the concurrent requests and isn't counted as a pool wait
+        assert metrics['pool_waits'] == 2
+        assert server.num_connections == 3
+
+
+def test_get_request_timeout():
+    assert kube_api_client._get_request_timeout(None) is None
+    assert kube_api_client._get_request_timeout(5) == 5
+    assert kube_api_client._get_request_timeout(0.5) == (0.5, 0.5)
+    assert kube_api_client._get_request_timeout((1, 2)) == (1, 2)
+
+
+def test_request_timeout():
+    with MockKubeApiServer(latency_seconds=0.5) as server:
+        api = _get_api(server, request_timeout_seconds=0.1)
+        request_timeouts = []
+        rest_client_request = api.api_client._rest_client_request
+
+        def _rest_client_request(*args, **kwargs):
+            request_timeouts.append(kwargs.get('_request_timeout'))
+            return rest_client_request(*args, **kwargs)
+
+        api.api_client._rest_client_request = _rest_client_request
+        with pytest.raises(Exception, match='timed out'):
+            api.list_namespace()
+        # an explicit request timeout is used instead of the default
+        assert api.list_namespace(_request_timeout=2).items == []
+        # float timeouts are converted to a (connect, read) tuple which all the kubernetes client versions support
+        with pytest.raises(Exception, match='timed out'):
+            api.list_namespace(_request_timeout=0.1)
+        # watch requests don't get the default timeout
+        assert api.list_namespace(watch=True, _preload_content=False).status == 200
+        assert api.api_client.get_metrics()['watch_requests'] == 1
+        # the pinned kubernetes client silently ignores float timeouts, only ints and (connect, read) tuples are used
+        assert request_timeouts == [(0.1, 0.1), 2, (0.1, 0.1), None]
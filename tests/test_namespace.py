@@ -3,11 +3,15 @@ import subprocess
 from textwrap import dedent
 
 import pytest
+from kubernetes import client, watch
+from kubernetes.client import V1Job, V1JobStatus
 from kubernetes.client.rest import ApiException
 from kubernetes.utils.create_from_yaml import FailToCreateError
 
-from cwm_worker_deployment import namespace, config
+from cwm_worker_deployment import namespace, config, http_session, kube_api_client
 
+from .mocks.prometheus import MockPrometheusServer
+from .mocks.kube_api import MockKubeApplyServer
 from .common import wait_for_cmd, wait_for_func, init_wait_namespace, init_wait_deploy_helm
 
 
@@ -127,6 +131,57 @@ def test_create_objects():
         ])
 
 
+def test_prometheus_batch_query():
+    assert namespace._get_prometheus_batch_query({
+        'a': 'rate(foo{namespace="ns"}[5m])',
+        'b': 'rate(foo{namespace="ns"}[1h])',
+    }) == (
+        'label_replace(sum(rate(foo{namespace="ns"}[5m])), "cwm_worker_deployment_metric", "a", "", "")'
+        ' or label_replace(sum(rate(foo{namespace="ns"}[1h])), "cwm_worker_deployment_metric", "b", "", "")'
+    )
+    assert namespace.metrics_check_prometheus_rate_queries('ns', {}) == {}
+
+
+def test_metrics_check_prometheus_rate_queries_bulk():
+    queries = {
+        metrics_check['name']: metrics_check['query']
+        for metrics_check in config.DEPLOYMENT_TYPES['minio']['metrics_checks']
+    }
+    namespace_names = ['cwdtest{}'.format(i) for i in range(25)]
+    prometheus_url = config.PROMETHEUS_URL
+    max_namespaces_per_query = config.PROMETHEUS_BULK_MAX_NAMESPACES_PER_QUERY
+    with MockPrometheusServer() as prometheus:
+        try:
+            config.PROMETHEUS_URL = prometheus.url
+            config.PROMETHEUS_BULK_MAX_NAMESPACES_PER_QUERY = 10
+            bulk_values = namespace.metrics_check_prometheus_rate_queries_bulk(namespace_names, queries)
+            assert prometheus.num_requests == 3
+            for namespace_name in namespace_names:
+                assert bulk_values[namespace_name] == namespace.metrics_check_prometheus_rate_queries(namespace_name, queries)
+            assert prometheus.num_requests == 3 + len(namespace_names)
+        finally:
+            config.PROMETHEUS_URL = prometheus_url
+            config.PROMETHEUS_BULK_MAX_NAMESPACES_PER_QUERY = max_namespaces_per_query
+    with pytest.raises(AssertionError):
+        namespace.metrics_check_prometheus_rate_queries_bulk(['invalid|namespace'], queries)
+
+
+def test_metrics_check_prometheus_rate_query_session():
+    query = config.DEPLOYMENT_TYPES['minio']['metrics_checks'][0]['query']
+    prometheus_url = config.PROMETHEUS_URL
+    with MockPrometheusServer() as prometheus:
+        try:
+            config.PROMETHEUS_URL = prometheus.url
+            http_session.set_session(http_session.create_session(pool_maxsize=1))
+            for _ in range(5):
+                assert namespace.metrics_check_prometheus_rate_query('cwdtest', query) == 7.0
+            assert prometheus.num_requests == 5
+            assert prometheus.num_connections == 1
+        finally:
+            config.PROMETHEUS_URL = prometheus_url
+            http_session.set_session(None)
+
+
 # we are not using the prometheus metrics at the moment
 # @pytest.mark.filterwarnings("ignore:Unverified HTTPS request.*")
 # def test_metrics_check_prometheus_rate_query():
@@ -170,6 +225,47 @@ def test_create_objects():
 #         prompf.terminate()
 
 
+def test_get_job_result():
+    assert namespace._get_job_result(V1Job(status=V1JobStatus(active=1))) is None
+    assert namespace._get_job_result(V1Job(status=V1JobStatus(succeeded=1))) is True
+    assert namespace._get_job_result(V1Job(status=V1JobStatus(failed=1))) is False
+    assert namespace._get_job_result(V1Job()) is None
+
+
+def test_wait_job_deleted(monkeypatch):
+    class MockBatchV1Api:
+
+        def __init__(self, job):
+            self.job = job
+
+        def read_namespaced_job_status(self, job_name, namespace_name):
+            if self.job is None:
+                raise ApiException(status=404, reason='Not Found')
+            return self.job
+
+        def list_namespaced_job(self, *args, **kwargs):
+            pass
+
+    class MockWatch:
+
+        def stream(self, func, *args, **kwargs):
+            yield {'type': 'DELETED', 'object': V1Job(status=V1JobStatus(active=1))}
+
+        def stop(self):
+            pass
+
+    # a job which was deleted externally is not waited for until the timeout
+    monkeypatch.setattr(namespace, 'get_batch_v1_api', lambda: MockBatchV1Api(None))
+    start_time = time.time()
+    assert namespace._wait_job('test', 'delete-data', 60, 5) is False
+    monkeypatch.setattr(namespace, 'get_batch_v1_api', lambda: MockBatchV1Api(
+        V1Job(metadata=client.V1ObjectMeta(resource_version='1'), status=V1JobStatus(active=1))
+    ))
+    monkeypatch.setattr(watch, 'Watch', MockWatch)
+    assert namespace._wait_job('test', 'delete-data', 60, 5) is False
+    assert time.time() - start_time < 5
+
+
 def test_delete_data():
     namespace_name = 'default'
     volume_config = {
@@ -219,5 +315,118 @@ def test_delete_data():
             'volume': volume_config
         })
         assert subprocess.call(['kubectl', '-n', namespace_name, 'exec', pod_name, '--', 'ls', '/data/{}'.format(subpath)]) == 1
+        subprocess.check_call(['kubectl', '-n', namespace_name, 'exec', pod_name, '--', 'mkdir', '-p', '/data/{}'.format(subpath)])
+        wait_for_cmd('kubectl -n {} get job delete-data'.format(namespace_name), 1, 30,
+                     'waited too long for delete data job to be deleted')
+        handle = namespace.delete_data_start(namespace_name, {
+            'subPath': subpath,
+            'volume': volume_config
+        })
+        wait_for_func(handle.poll, True, 60, 'waited too long for delete data job to complete')
+        assert handle.done()
+        assert subprocess.call(['kubectl', '-n', namespace_name, 'exec', pod_name, '--', 'ls', '/data/{}'.format(subpath)]) == 1
     finally:
         namespace.coreV1Api.delete_namespaced_pod(pod_name, namespace_name)
+
+
+def test_apply_objects(monkeypatch):
+    with MockKubeApplyServer() as server:
+        configuration = client.Configuration()
+        configuration.host = server.url
+        configuration.api_key = {'authorization': 'Bearer test-token'}
+        api_client = kube_api_client.ApiClient(configuration)
+        api_client.set_default_header('X-Default-Header', 'test')
+        monkeypatch.setattr(namespace, '_clients', {'apiClient': api_client})
+        objects = [
+            {'apiVersion': 'v1', 'kind': 'PersistentVolume', 'metadata': {'name': 'pv'}, 'spec': {'capacity': {'storage': '1Gi'}}},
+            {'apiVersion': 'v1', 'kind': 'PersistentVolumeClaim', 'metadata': {'name': 'pvc'}, 'spec': {'volumeName': 'pv'}},
+            {'apiVersion': 'apps/v1', 'kind': 'Deployment', 'metadata': {'name': 'dep'}, 'spec': {'replicas': 1}},
+        ]
+        assert [r['result'] for r in namespace.apply_objects('test', objects, max_workers=2)] == ['created', 'created', 'created']
+        query = 'fieldManager=cwm-worker-deployment&force=true'
+        assert sorted(server.requests) == [
+            ('GET', '/api/v1/namespaces/test/persistentvolumeclaims/pvc', '', None),
+            ('GET', '/api/v1/persistentvolumes/pv', '', None),
+            ('GET', '/apis/apps/v1/namespaces/test/deployments/dep', '', None),
+            ('PATCH', '/api/v1/namespaces/test/persistentvolumeclaims/pvc', query, 'application/apply-patch+yaml'),
+            ('PATCH', '/api/v1/persistentvolumes/pv', query, 'application/apply-patch+yaml'),
+            ('PATCH', '/apis/apps/v1/namespaces/test/deployments/dep', query, 'application/apply-patch+yaml'),
+        ]
+        assert server.objects['/api/v1/namespaces/test/persistentvolumeclaims/pvc'][0]['metadata'] == {'name': 'pvc', 'namespace': 'test'}
+        assert 'namespace' not in server.objects['/api/v1/persistentvolumes/pv'][0]['metadata']
+        # a no-op apply right after the previous apply is unchanged
+        assert [r['result'] for r in namespace.apply_objects('test', objects)] == ['unchanged', 'unchanged', 'unchanged']
+        objects[2]['spec']['replicas'] = 2
+        assert namespace.apply_objects('test', objects) == [
+            {'kind': 'PersistentVolume', 'name': 'pv', 'result': 'unchanged'},
+            {'kind': 'PersistentVolumeClaim', 'name': 'pvc', 'result': 'unchanged'},
+            {'kind': 'Deployment', 'name': 'dep', 'result': 'updated'},
+        ]
+        assert server.authorizations == {'Bearer test-token'}
+        assert server.default_headers == {'test'}
+        with pytest.raises(ApiException, match='Forbidden'):
+            namespace.apply_objects('test', [{'apiVersion': 'v1', 'kind': 'ConfigMap', 'metadata': {'name': 'forbidden'}}])
+        with pytest.raises(AssertionError, match='unsupported kind for apply: Unknown'):
+            namespace.apply_objects('test', [{'apiVersion': 'v1', 'kind': 'Unknown', 'metadata': {'name': 'x'}}])
+
+
+def _kube_metrics_deployment(namespace_name, available_replicas, containers_resources):
+    return {
+        'metadata': {'namespace': namespace_name},
+        'spec': {'template': {'spec': {'containers': [{'resources': resources} for resources in containers_resources]}}},
+        'status': {'availableReplicas': available_replicas} if available_replicas is not None else {},
+    }
+
+
+def test_get_kube_metrics_bulk(monkeypatch):
+    deployments = [
+        _kube_metrics_deployment('ns1', 2, [{'limits': {'memory': '512Mi'}, 'requests': {'memory': '256Mi'}}, {}]),
+        _kube_metrics_deployment('ns1', 1, [{'requests': {'memory': '1Gi'}}]),
+        _kube_metrics_deployment('ns2', None, [{'limits': {'memory': '512Mi'}}]),
+        _kube_metrics_deployment('ns3', 1, [{'limits': {'memory': '1G'}, 'requests': None}]),
+    ]
+    monkeypatch.setattr(namespace, 'get_all_deployments', lambda label_selector=None: deployments)
+    monkeypatch.setattr(namespace, 'get_deployments', lambda namespace_name: [
+        d for d in deployments if d['metadata']['namespace'] == namespace_name
+    ])
+    namespace._parse_quantity_bytes.cache_clear()
+    expected_ns1 = {'ram_limit_bytes': 2 * 512 * 1024 * 1024, 'ram_requests_bytes': 2 * 256 * 1024 * 1024 + 1024 * 1024 * 1024}
+    assert namespace.get_kube_metrics_bulk() == {
+        'ns1': expected_ns1,
+        'ns2': {'ram_limit_bytes': 0, 'ram_requests_bytes': 0},
+        'ns3': {'ram_limit_bytes': 1000000000, 'ram_requests_bytes': 0},
+    }
+    assert namespace.get_kube_metrics_bulk(['ns1', 'ns4']) == {
+        'ns1': expected_ns1,
+        'ns4': {'ram_limit_bytes': 0, 'ram_requests_bytes': 0},
+    }
+    assert namespace.get_kube_metrics('ns1') == expected_ns1
+    # each quantity string was parsed once
+    assert namespace._parse_quantity_bytes.cache_info().misses == 4
+
+
+def test_release_fingerprint_latest_revision(monkeypatch):
+    secrets = [
+        {'metadata': {'name': 'sh.helm.release.v1.minio-test.v1', 'labels': {
+            'owner': 'helm', 'name': 'minio-test', 'version': '1', 'status': 'superseded'}}},
+        {'metadata': {'name': 'sh.helm.release.v1.minio-test.v2', 'labels': {
+            'owner': 'helm', 'name': 'minio-test', 'version': '2', 'status': 'deployed',
+            namespace.RELEASE_FINGERPRINT_LABEL: 'fingerprint2'}}},
+    ]
+    label_selectors = []
+
+    def get_secrets(namespace_name, label_selector=None):
+        label_selectors.append(label_selector)
+        return secrets
+
+    monkeypatch.setattr(namespace, 'get_secrets', get_secrets)
+    assert namespace.get_release_fingerprint('test', 'minio-test') == 'fingerprint2'
+    assert label_selectors == ['owner=helm,name=minio-test']
+    # after a failed upgrade the previous revision is still deployed, but the resources may have been changed
+    secrets.append({'metadata': {'name': 'sh.helm.release.v1.minio-test.v10', 'labels': {
+        'owner': 'helm', 'name': 'minio-test', 'version': '10', 'status': 'failed'}}})
+    assert namespace.get_release_fingerprint('test', 'minio-test') is None
+    with pytest.raises(AssertionError, match='deployed release not found'):
+        namespace.set_release_fingerprint('test', 'minio-test', 'fingerprint10')
+    secrets[-1]['metadata']['labels']['status'] = 'pending-upgrade'
+    assert namespace.get_release_fingerprint('test', 'minio-test') is None
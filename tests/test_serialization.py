@@ -0,0 +1,37 @@
+import io
+import json
+import datetime
+
+from ruamel import yaml
+
+from cwm_worker_deployment import serialization
+
+
+YAML_DOCUMENT = """
+a: yes
+b: 010
+c: 1.0
+d: 2021-01-01
+e: [1, "2", null, true]
+f:
+  g: '0.0.0-20210101T000000'
+  h: |
+    multi
+    line
+"""
+
+
+def test_yaml_safe_load():
+    assert serialization.yaml_safe_load(YAML_DOCUMENT) == yaml.safe_load(YAML_DOCUMENT)
+
+
+def test_dump_values():
+    values = {'a': 'yes', 'b': [1, 2.5, None, True], 'c': {'d': 'multi\nline'}}
+    f = io.StringIO()
+    serialization.dump_values(values, f)
+    assert json.loads(f.getvalue()) == values
+    assert yaml.safe_load(f.getvalue()) == values
+    values['e'] = datetime.date(2021, 1, 1)
+    f = io.StringIO()
+    serialization.dump_values(values, f)
+    assert yaml.safe_load(f.getvalue()) == values
@@ -0,0 +1,74 @@
+import os
+import stat
+import tempfile
+import threading
+
+import pytest
+
+from cwm_worker_deployment import client
+from cwm_worker_deployment import server
+
+
+class MockDeployment:
+
+    def __init__(self):
+        self.calls = []
+
+    def is_ready(self, namespace_name, deployment_type):
+        self.calls.append(('is_ready', namespace_name, deployment_type))
+        return namespace_name == 'ready'
+
+    def deploy(self, spec, dry_run=False):
+        raise Exception('deploy failed')
+
+
+@pytest.fixture(params=['tcp', 'unix'])
+def mock_server(request):
+    deployment = MockDeployment()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if request.param == 'unix':
+            unix_socket_path = os.path.join(tmpdir, 'server.sock')
+            httpd = server.create_server(unix_socket_path=unix_socket_path, deployment_lib=deployment)
+            server_url = 'unix://{}'.format(unix_socket_path)
+        else:
+            httpd = server.create_server(host='127.0.0.1', port=0, deployment_lib=deployment)
+            server_url = 'http://127.0.0.1:{}'.format(httpd.server_address[1])
+        thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        thread.start()
+        try:
+            yield server_url, deployment
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+
+
+def test_server(mock_server):
+    server_url, deployment = mock_server
+    assert client.call('is_ready', server_url=server_url, namespace_name='ready', deployment_type='minio') is True
+    assert client.call('is_ready', server_url=server_url, namespace_name='not-ready', deployment_type='minio') is False
+    assert deployment.calls == [('is_ready', 'ready', 'minio'), ('is_ready', 'not-ready', 'minio')]
+    with pytest.raises(Exception, match='Exception: deploy failed'):
+        client.call('deploy', server_url=server_url, spec={})
+    with pytest.raises(Exception, match='unknown method: init'):
+        client.call('init', server_url=server_url, spec={})
+    with pytest.raises(Exception, match="TypeError: .*unexpected keyword argument 'foo'"):
+        client.call('is_ready', server_url=server_url, foo='bar')
+
+
+def test_server_default_unix_socket(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        unix_socket_path = os.path.join(tmpdir, 'server.sock')
+        monkeypatch.setattr(server.config, 'CWM_WORKER_DEPLOYMENT_SERVER_UNIX_SOCKET', unix_socket_path)
+        httpd = server.create_server(deployment_lib=MockDeployment())
+        try:
+            assert isinstance(httpd, server.UnixThreadingHTTPServer)
+            assert httpd.server_address == unix_socket_path
+            assert stat.S_IMODE(os.stat(unix_socket_path).st_mode) == 0o600
+        finally:
+            httpd.server_close()
+        httpd = server.create_server(port=0, deployment_lib=MockDeployment())
+        try:
+            assert httpd.server_address[0] == '127.0.0.1'
+            assert httpd.server_address[1] != 8086
+        finally:
+            httpd.server_close()